@@ -0,0 +1 @@
+"""Benchmarks for the expense tracker backend (run from the backend directory)"""
@@ -0,0 +1,62 @@
+"""Offline evaluation of the local categorizer against a labeled fixture set.
+
+Each user's expenses are replayed in order. The local classifier predicts first,
+then the true label is added to that user's model, mirroring what create_expense
+does in production. Predictions below the threshold count as LLM calls.
+
+Usage (from the backend directory):
+    python -m benchmarks.categorizer_eval [--fixture PATH] [--thresholds 0.6 0.8 0.9]
+"""
+import argparse
+import json
+from pathlib import Path
+
+from local_classifier import LocalClassifier, UserCategoryModel
+
+DEFAULT_FIXTURE = Path(__file__).parent / "fixtures" / "labeled_expenses.json"
+
+
+def evaluate(rows: list, threshold: float) -> dict:
+    classifier = LocalClassifier(threshold)
+    models = {}
+    answered = correct = 0
+    by_source = {"rules": [0, 0], "model": [0, 0]}
+    for row in rows:
+        model = models.setdefault(row["user"], UserCategoryModel())
+        category, _, source = classifier.classify(row["description"], model)
+        if category:
+            answered += 1
+            hit = category == row["category"]
+            correct += hit
+            by_source[source][0] += 1
+            by_source[source][1] += hit
+        model.observe(row["description"], row["category"])
+
+    return {
+        "threshold": threshold,
+        "expenses": len(rows),
+        "llm_calls_avoided": answered / len(rows) if rows else 0,
+        "local_accuracy": correct / answered if answered else 0,
+        "rules": by_source["rules"],
+        "model": by_source["model"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", type=Path, default=DEFAULT_FIXTURE)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.6, 0.7, 0.8, 0.9])
+    args = parser.parse_args()
+
+    rows = json.loads(args.fixture.read_text())
+    print(f"{'threshold':>9} {'avoided':>8} {'accuracy':>9} {'rules (ok/n)':>13} {'model (ok/n)':>13}")
+    for threshold in args.thresholds:
+        r = evaluate(rows, threshold)
+        print(
+            f"{r['threshold']:>9.2f} {r['llm_calls_avoided']:>8.1%} {r['local_accuracy']:>9.1%} "
+            f"{r['rules'][1]:>6}/{r['rules'][0]:<6} {r['model'][1]:>6}/{r['model'][0]:<6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Measure how long a fresh interpreter takes to import server.py, the work every
+serverless cold start pays before it can handle a request.
+
+Each run imports the module in a new process with `python -X importtime`. The script
+prints the median import time and the slowest top-level imports. It exits non-zero
+when the median is over the budget or when a module that should load lazily was
+imported anyway.
+
+No database is needed: the Mongo client is not created at import time.
+
+Usage (from the backend directory):
+    python -m benchmarks.cold_start [--runs 5] [--budget-ms 1500] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# Imported on first use by server.py; loading any of these at import time is a regression
+DEFERRED_MODULES = ["motor", "pymongo", "passlib", "emergentintegrations", "concurrent.futures.process"]
+
+PROBE = f"""
+import sys, time
+started = time.perf_counter()
+import server
+elapsed = (time.perf_counter() - started) * 1000
+loaded = [m for m in {DEFERRED_MODULES!r} if m in sys.modules]
+print(f"{{elapsed:.1f}} {{','.join(loaded)}}")
+"""
+
+
+def run_probe() -> tuple:
+    env = {**os.environ, "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017")}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    elapsed, _, loaded = result.stdout.strip().splitlines()[-1].partition(" ")
+    return float(elapsed), [m for m in loaded.split(",") if m], result.stderr
+
+
+def slowest_imports(importtime_log: str, top: int) -> list:
+    """(cumulative ms, module) for modules imported directly by server.py"""
+    entries = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        entries.append((len(name) - len(name.lstrip()), int(cumulative), name.strip()))
+
+    # Entries are logged after their own imports, so server's subtree is the run of deeper
+    # entries just before it; its direct children sit exactly one level (two spaces) below
+    server_at = next((i for i, (_, _, name) in enumerate(entries) if name == "server"), None)
+    if server_at is None:
+        return []
+    depth = entries[server_at][0]
+    rows = []
+    for indent, cumulative, name in reversed(entries[:server_at]):
+        if indent <= depth:
+            break
+        if indent == depth + 2:
+            rows.append((cumulative / 1000, name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("COLD_START_BUDGET_MS", 1500)))
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    samples, loaded, log = [], set(), ""
+    for _ in range(args.runs):
+        elapsed, modules, log = run_probe()
+        samples.append(elapsed)
+        loaded.update(modules)
+
+    print(f"{'cumulative ms':>14}  module")
+    for ms, name in slowest_imports(log, args.top):
+        print(f"{ms:>14.1f}  {name}")
+    median = statistics.median(samples)
+    print(f"\nimport server: median {median:.1f} ms, min {min(samples):.1f} ms over {args.runs} run(s); budget {args.budget_ms:.0f} ms")
+
+    failed = False
+    if loaded:
+        print(f"FAIL: imported at module load but should be deferred: {', '.join(sorted(loaded))}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"FAIL: median import time is over budget by {median - args.budget_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Compare dashboard stats paths: the original load-everything loop, the $facet
+aggregation and the incrementally maintained spending rollups.
+
+Requires a reachable MongoDB (MONGO_URL). Data is written to a throwaway database
+(BENCH_DB_NAME, default "expense_tracker_bench") which is dropped afterwards.
+
+Usage (from the backend directory):
+    python -m benchmarks.dashboard_stats --sizes 1000 10000 100000 --runs 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+import server
+
+CATEGORIES = ["Food", "Transportation", "Shopping", "Entertainment", "Bills", "Healthcare", "Education", "Other"]
+
+
+def make_user(user_id: str) -> dict:
+    # rebuild_rollups marks this document as built, which switches reads to the stored rollups
+    return {
+        "id": user_id,
+        "email": f"{user_id}@bench.example.com",
+        "name": "Benchmark",
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def make_expenses(user_id: str, count: int) -> list:
+    today = date.today()
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "amount_cents": random.randint(100, 20000),
+            "category": random.choice(CATEGORIES),
+            "description": f"Benchmark expense {i}",
+            "date": server.expense_date_to_bson((today - timedelta(days=random.randint(0, 730))).isoformat()),
+            "ai_categorized": False,
+            "category_pending": False,
+            "created_at": now,
+        }
+        for i in range(count)
+    ]
+
+
+async def legacy_dashboard_stats(db, user_id: str) -> dict:
+    """The original implementation: pull every document and aggregate in Python"""
+    expenses = [server.expense_from_doc(doc) for doc in await db.expenses.find({"user_id": user_id}, {"_id": 0}).to_list(None)]
+    category_totals = {}
+    monthly_totals = {}
+    for exp in expenses:
+        category_totals[exp['category']] = category_totals.get(exp['category'], 0) + exp['amount']
+        monthly_totals[exp['date'][:7]] = monthly_totals.get(exp['date'][:7], 0) + exp['amount']
+    return {
+        "total_expenses": sum(exp['amount'] for exp in expenses),
+        "expense_count": len(expenses),
+        "category_breakdown": sorted(category_totals.items(), key=lambda x: x[1], reverse=True),
+        "monthly_trend": sorted(monthly_totals.items())[-6:],
+    }
+
+
+async def facet_dashboard_stats(db, user_id: str) -> dict:
+    results = await db.expenses.aggregate(server.dashboard_stats_pipeline(user_id)).to_list(1)
+    return server.dashboard_stats_from_facets(results[0] if results else {})
+
+
+async def rollup_dashboard_stats(user_id: str) -> dict:
+    return server.dashboard_stats_from_rollups(await server.get_stored_rollups(user_id))
+
+
+async def time_runs(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(os.environ["MONGO_URL"], tz_aware=True)
+    db = client[os.environ.get("BENCH_DB_NAME", "expense_tracker_bench")]
+    server.db = db
+    await db.expenses.create_index([("user_id", 1), ("date", -1)])
+    await db.spending_rollups.create_index([("user_id", 1), ("month", 1), ("category", 1)], unique=True)
+
+    print(f"{'expenses':>10} {'legacy ms':>12} {'facet ms':>12} {'rollup ms':>12}")
+    try:
+        for size in args.sizes:
+            user_id = str(uuid.uuid4())
+            await db.users.insert_one(make_user(user_id))
+            docs = make_expenses(user_id, size)
+            for start in range(0, size, 10000):
+                await db.expenses.insert_many(docs[start:start + 10000])
+            await server.rebuild_rollups(user_id)
+            # Otherwise the dashboard would still be served from the raw-expense fallback
+            assert await server.rollups_ready(user_id)
+
+            legacy = await legacy_dashboard_stats(db, user_id)
+            facet = await facet_dashboard_stats(db, user_id)
+            assert legacy["expense_count"] == facet["expense_count"] == size
+            rollup = await rollup_dashboard_stats(user_id)
+            assert rollup["expense_count"] == size
+            assert abs(legacy["total_expenses"] - facet["total_expenses"]) < 0.01
+            assert abs(legacy["total_expenses"] - rollup["total_expenses"]) < 0.01
+
+            legacy_ms = await time_runs(lambda: legacy_dashboard_stats(db, user_id), args.runs)
+            facet_ms = await time_runs(lambda: facet_dashboard_stats(db, user_id), args.runs)
+            rollup_ms = await time_runs(lambda: rollup_dashboard_stats(user_id), args.runs)
+            print(f"{size:>10} {legacy_ms:>12.1f} {facet_ms:>12.1f} {rollup_ms:>12.1f}")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
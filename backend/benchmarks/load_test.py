@@ -0,0 +1,213 @@
+"""In-process load test: many simulated users driving the API concurrently.
+
+The FastAPI app is called through an ASGI transport, so no server process or network
+is involved. MongoDB is replaced by mongomock-motor unless --mongo-url is given, in
+which case a throwaway database (BENCH_DB_NAME, default "expense_tracker_load") is used
+and dropped afterwards. The LLM client is replaced by a stub that sleeps for
+--llm-latency-ms before answering.
+
+Each simulated user registers, logs in, adds expenses, lists them, loads the dashboard
+and asks for financial advice. Latency percentiles and requests/sec are reported per
+route; --json writes the same figures to a file for comparison across commits.
+
+Requires httpx, plus mongomock-motor when no --mongo-url is given.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_test --users 200 --concurrency 50 --expenses 5 --llm-latency-ms 300
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import time
+import uuid
+from pathlib import Path
+
+DESCRIPTIONS = [
+    "Starbucks coffee", "Uber ride home", "Netflix subscription", "Grocery run at Kroger",
+    "Electricity bill", "Pharmacy prescription", "Udemy course", "Birthday gift", "Parking downtown",
+    "Something unusual",
+]
+
+
+class StubUserMessage:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubLlmChat:
+    """Answers like the real client after a fixed delay"""
+
+    latency = 0.0
+
+    def __init__(self, **kwargs):
+        self.system_message = kwargs.get("system_message", "")
+
+    def with_model(self, provider: str, model: str):
+        return self
+
+    def _reply(self, text: str) -> str:
+        if "financial advisor" in self.system_message:
+            return "1. Cook at home more often.\n2. Cancel unused subscriptions.\n3. Set a weekly budget."
+        if text.startswith("Categorize these expenses:"):
+            return json.dumps(["Other"] * (len(text.splitlines()) - 1))
+        return "Other"
+
+    async def send_message(self, message) -> str:
+        await asyncio.sleep(self.latency)
+        return self._reply(message.text)
+
+    async def run_astream(self, message):
+        words = self._reply(message.text).split(" ")
+        for word in words:
+            await asyncio.sleep(self.latency / len(words))
+            yield {"type": "text", "text": word + " "}
+
+
+def percentile(sorted_samples: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    async def call(self, http, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        response = await http.request(method, url, **kwargs)
+        self.samples.setdefault(route, []).append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+    def report(self, wall_seconds: float) -> list:
+        rows = []
+        for route, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            rows.append({
+                "route": route,
+                "requests": len(samples),
+                "errors": self.errors.get(route, 0),
+                "rps": len(samples) / wall_seconds,
+                "p50_ms": percentile(samples, 50),
+                "p95_ms": percentile(samples, 95),
+                "p99_ms": percentile(samples, 99),
+            })
+        return rows
+
+
+async def simulate_user(http, recorder: Recorder, expenses: int):
+    email = f"load-{uuid.uuid4().hex}@example.com"
+    credentials = {"email": email, "password": "load-test-password"}
+    await recorder.call(http, "POST /api/auth/register", "POST", "/api/auth/register", json={**credentials, "name": "Load Test"})
+    login = await recorder.call(http, "POST /api/auth/login", "POST", "/api/auth/login", json=credentials)
+    headers = {"Authorization": f"Bearer {login.json()['token']}"}
+
+    for _ in range(expenses):
+        await recorder.call(http, "POST /api/expenses", "POST", "/api/expenses", headers=headers, json={
+            "amount": round(random.uniform(1, 200), 2),
+            "description": random.choice(DESCRIPTIONS),
+            "date": f"2024-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+        })
+    await recorder.call(http, "GET /api/expenses", "GET", "/api/expenses", headers=headers)
+    await recorder.call(http, "GET /api/dashboard/stats", "GET", "/api/dashboard/stats", headers=headers)
+    await recorder.call(http, "GET /api/ai/financial-advice", "GET", "/api/ai/financial-advice", headers=headers)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args) -> tuple:
+    import httpx
+    import server
+
+    # One INFO line per request would swamp the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    StubLlmChat.latency = args.llm_latency_ms / 1000
+    server._llm_classes = (StubLlmChat, StubUserMessage)
+
+    client = None
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(args.mongo_url, tz_aware=True)
+        server.db = client[os.environ.get("BENCH_DB_NAME", "expense_tracker_load")]
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        server.db = AsyncMongoMockClient(tz_aware=True)["expense_tracker_load"]
+    # Same per-operation instrumentation as the lazily created production database
+    server.db = server.InstrumentedDatabase(server.db)
+    await server.ensure_indexes()
+
+    recorder = Recorder()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one_user(http):
+        async with semaphore:
+            await simulate_user(http, recorder, args.expenses)
+
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://load-test", timeout=None) as http:
+            started = time.perf_counter()
+            await asyncio.gather(*(one_user(http) for _ in range(args.users)))
+            wall_seconds = time.perf_counter() - started
+    finally:
+        server.password_pool.shutdown()
+        if client is not None:
+            await client.drop_database(server.db._database.name)
+            client.close()
+
+    return recorder.report(wall_seconds), wall_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20, help="Simulated users active at once")
+    parser.add_argument("--expenses", type=int, default=5, help="Expenses added by each user")
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="Lower than production so hashing does not dominate")
+    parser.add_argument("--mongo-url", default=None, help="Use a real MongoDB instead of mongomock-motor")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # server reads these at import time
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ.setdefault("MONGO_URL", args.mongo_url or "mongodb://localhost:27017")
+    os.environ.setdefault("CATEGORIZATION_WORKER_ENABLED", "false")
+
+    rows, wall_seconds = asyncio.run(run(args))
+
+    print(f"{args.users} users, concurrency {args.concurrency}, {args.expenses} expenses each, "
+          f"LLM latency {args.llm_latency_ms:.0f} ms, {wall_seconds:.1f} s")
+    print(f"{'route':<28} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for r in rows:
+        print(f"{r['route']:<28} {r['requests']:>8} {r['errors']:>6} {r['rps']:>8.1f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f}")
+
+    if args.json:
+        args.json.write_text(json.dumps({
+            "revision": git_revision(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("json", "mongo_url")},
+            "wall_seconds": wall_seconds,
+            "routes": rows,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
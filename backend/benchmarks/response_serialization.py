@@ -0,0 +1,89 @@
+"""Compare the two ways GET /expenses can serialize a page of stored expenses:
+FastAPI's response_model validation plus the stdlib JSONResponse, and the
+FAST_JSON_RESPONSES path (trusted projection, no per-row models, orjson when installed).
+
+No database is needed; rows are generated in the stored document format.
+
+Usage (from the backend directory):
+    python -m benchmarks.response_serialization --sizes 100 1000 10000 --runs 5
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import server
+
+CATEGORIES = ["Food", "Transportation", "Shopping", "Entertainment", "Bills", "Healthcare", "Education", "Other"]
+
+
+def make_docs(count: int) -> list:
+    user_id = str(uuid.uuid4())
+    today = date.today()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "amount_cents": random.randint(100, 20000),
+            "category": random.choice(CATEGORIES),
+            "description": f"Benchmark expense {i}",
+            "date": server.expense_date_to_bson((today - timedelta(days=random.randint(0, 730))).isoformat()),
+            "ai_categorized": False,
+            "category_pending": False,
+            "created_at": datetime.now(timezone.utc),
+        }
+        for i in range(count)
+    ]
+
+
+async def validated_response(docs: list, field) -> bytes:
+    """What FastAPI does for a route with response_model=List[Expense]"""
+    expenses = [server.expense_from_doc(dict(doc)) for doc in docs]
+    content = await serialize_response(field=field, response_content=expenses)
+    return JSONResponse(content).body
+
+
+async def fast_response(docs: list) -> bytes:
+    expenses = [{**server.EXPENSE_DEFAULTS, **server.expense_from_doc(dict(doc))} for doc in docs]
+    return server.FastJSONResponse(expenses).body
+
+
+async def time_runs(fn, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    field = create_response_field(name="Response_get_expenses", type_=List[server.Expense])
+    encoder = "orjson" if server.orjson is not None else "json"
+    print(f"fast path encoder: {encoder}")
+    print(f"{'rows':>8} {'validated rows/s':>17} {'fast rows/s':>13} {'speedup':>8}")
+    for size in args.sizes:
+        docs = make_docs(size)
+        assert json.loads(await validated_response(docs, field))[0]["id"] == json.loads(await fast_response(docs))[0]["id"]
+
+        validated_s = await time_runs(lambda: validated_response(docs, field), args.runs)
+        fast_s = await time_runs(lambda: fast_response(docs), args.runs)
+        print(f"{size:>8} {size / validated_s:>17,.0f} {size / fast_s:>13,.0f} {validated_s / fast_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,120 @@
+"""Measure GET /expenses/search latency as a user's history grows, next to what the
+client had to do before: download the whole list and scan descriptions itself.
+
+For each history size a fresh user is seeded with that many expenses, then every query
+in --queries is run --runs times through the text index and through the full-list scan.
+Median and p95 latency are reported per size.
+
+Needs a real MongoDB (mongomock cannot evaluate $text). A throwaway database
+(BENCH_DB_NAME, default "expense_tracker_search") is created and dropped afterwards.
+
+Usage (from the backend directory):
+    python -m benchmarks.search_latency --mongo-url mongodb://localhost:27017 --sizes 1000 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+DESCRIPTIONS = [
+    "Starbucks coffee", "Uber ride home", "Uber ride to airport", "Netflix subscription",
+    "Grocery run at Kroger", "Electricity bill", "Pharmacy prescription", "Udemy course",
+    "Birthday gift", "Parking downtown", "Lunch with team", "Spotify premium", "Gas station fill up",
+]
+
+
+def make_docs(server, user_id: str, count: int) -> list:
+    today = date.today()
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "amount_cents": random.randint(100, 20000),
+            "category": "Other",
+            "description": f"{random.choice(DESCRIPTIONS)} #{i}",
+            "date": server.expense_date_to_bson((today - timedelta(days=random.randint(0, 1825))).isoformat()),
+            "ai_categorized": False,
+            "category_pending": False,
+            "created_at": datetime.now(timezone.utc),
+        }
+        for i in range(count)
+    ]
+
+
+async def indexed_search(server, user_id: str, q: str, limit: int) -> list:
+    projection = {**server.EXPENSE_PROJECTION, "score": {"$meta": "textScore"}}
+    return await server.db.expenses.find(server.expense_search_query(user_id, q), projection) \
+        .sort(server.EXPENSE_SEARCH_SORT).limit(limit).to_list(limit)
+
+
+async def client_side_scan(server, user_id: str, q: str, limit: int) -> list:
+    """The old approach: fetch every expense and filter descriptions in the client"""
+    docs = await server.db.expenses.find({"user_id": user_id}, server.EXPENSE_PROJECTION).sort(server.EXPENSE_SORT).to_list(None)
+    words = q.lower().split()
+    return [d for d in docs if any(w in d["description"].lower() for w in words)][:limit]
+
+
+async def time_query(fn, runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)
+
+
+def p95(samples: list) -> float:
+    return samples[min(len(samples) - 1, round(0.95 * len(samples)) - 1)]
+
+
+async def run(args):
+    from motor.motor_asyncio import AsyncIOMotorClient
+    import server
+
+    client = AsyncIOMotorClient(args.mongo_url, tz_aware=True)
+    server.db = client[os.environ.get("BENCH_DB_NAME", "expense_tracker_search")]
+    await server.ensure_indexes()
+
+    print(f"{'history':>8} {'search p50 ms':>14} {'search p95 ms':>14} {'scan p50 ms':>12} {'scan p95 ms':>12}")
+    try:
+        for size in args.sizes:
+            user_id = str(uuid.uuid4())
+            docs = make_docs(server, user_id, size)
+            for start in range(0, size, 5000):
+                await server.db.expenses.insert_many(docs[start:start + 5000], ordered=False)
+
+            search, scan = [], []
+            for q in args.queries:
+                search += await time_query(lambda: indexed_search(server, user_id, q, args.limit), args.runs)
+                scan += await time_query(lambda: client_side_scan(server, user_id, q, args.limit), args.runs)
+            search.sort()
+            scan.sort()
+            print(f"{size:>8} {statistics.median(search):>14.1f} {p95(search):>14.1f} "
+                  f"{statistics.median(scan):>12.1f} {p95(scan):>12.1f}")
+    finally:
+        await client.drop_database(server.db.name)
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL"), required="MONGO_URL" not in os.environ)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", nargs="+", default=["uber", "netflix", "coffee", "uber rides"])
+    parser.add_argument("--limit", type=int, default=50, help="Results per page")
+    parser.add_argument("--runs", type=int, default=20, help="Runs per query and size")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    # server reads this at import time
+    os.environ.setdefault("MONGO_URL", args.mongo_url)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
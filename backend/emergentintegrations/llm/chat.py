@@ -10,10 +10,21 @@ class LlmChat:
         self.temperature = kwargs.get('temperature', 0.7)
         self.max_tokens = kwargs.get('max_tokens', 100)
 
+    def with_model(self, provider: str, model: str):
+        self.model = model
+        return self
+
+    async def send_message(self, message) -> str:
+        """Mock completion: the streamed chunks joined together"""
+        return "".join([chunk["text"] async for chunk in self.run_astream(message)])
+
     async def run_astream(self, message):
         """Mock streaming response"""
         # Return a simple mock response for expense categorization
-        if "Categorize this expense" in message.text:
+        if message.text.startswith("Categorize these expenses:"):
+            count = len(message.text.splitlines()) - 1
+            yield {"type": "text", "text": "[" + ", ".join(['"Food"'] * count) + "]"}
+        elif "Categorize this expense" in message.text:
             yield {"type": "text", "text": "Food"}
         elif "insights and recommendations" in message.text:
             yield {"type": "text", "text": "You're spending a lot on food. Consider meal prepping to save money."}
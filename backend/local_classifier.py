@@ -0,0 +1,150 @@
+"""Fast local expense categorizer used in front of the LLM.
+
+Two tiers answer without any network call:
+- keyword rules shared by every user
+- a small multinomial naive Bayes model trained on one user's categorized expenses
+
+Each returns a category with a confidence in [0, 1]; callers fall back to the LLM
+when neither clears the threshold.
+"""
+import math
+import re
+from typing import Iterable, List, Optional, Tuple
+
+CATEGORY_KEYWORDS = {
+    "Food": {
+        "food", "restaurant", "cafe", "coffee", "starbucks", "mcdonald", "mcdonalds", "burger", "pizza",
+        "sushi", "lunch", "dinner", "breakfast", "brunch", "grocery", "groceries", "supermarket", "bakery",
+        "snack", "snacks", "takeout", "doordash", "ubereats", "grubhub", "kfc", "subway", "chipotle",
+        "dominos", "tacos", "taco", "diner", "bar", "pub", "beer", "wine", "meal", "walmart", "kroger",
+        "safeway", "trader", "wholefoods", "costco", "tea", "donut", "dunkin",
+    },
+    "Transportation": {
+        "uber", "lyft", "taxi", "cab", "bus", "train", "metro", "fare", "gas", "fuel",
+        "petrol", "parking", "toll", "tolls", "shell", "chevron", "exxon", "bp", "transit", "ride",
+        "flight", "airline", "airfare", "car", "rental", "tire", "tires", "oil", "mechanic", "scooter",
+        "bike",
+    },
+    "Shopping": {
+        "amazon", "shopping", "clothes", "clothing", "shoes", "shirt", "jeans", "dress", "target", "ikea",
+        "mall", "store", "electronics", "laptop", "phone", "headphones", "furniture", "gift", "gifts",
+        "ebay", "etsy", "bestbuy", "zara", "nike", "adidas", "jacket",
+    },
+    "Entertainment": {
+        "movie", "movies", "cinema", "netflix", "spotify", "hulu", "disney", "concert", "tickets",
+        "ticket", "game", "games", "steam", "playstation", "xbox", "nintendo", "theater", "theatre",
+        "museum", "bowling", "karaoke", "festival", "youtube", "twitch", "hbo",
+    },
+    "Bills": {
+        "rent", "electricity", "electric", "water", "internet", "wifi", "utility", "utilities", "bill",
+        "bills", "insurance", "mortgage", "cable", "verizon", "comcast", "att", "tmobile",
+        "subscription", "loan", "payment", "tax", "taxes", "heating",
+    },
+    "Healthcare": {
+        "doctor", "dentist", "dental", "pharmacy", "medicine", "medication", "hospital", "clinic",
+        "prescription", "cvs", "walgreens", "therapy", "therapist", "vitamins", "checkup", "optometrist",
+        "glasses", "health", "medical", "gym",
+    },
+    "Education": {
+        "tuition", "textbook", "textbooks", "book", "books", "course", "courses", "udemy", "coursera",
+        "school", "college", "university", "class", "classes", "exam", "workshop", "seminar", "tutor",
+        "tutoring", "stationery", "notebook",
+    },
+}
+
+STOPWORDS = {
+    "a", "an", "the", "at", "for", "from", "to", "of", "on", "in", "and", "with", "my", "s", "some",
+}
+
+RULE_CONFIDENCE = 0.95
+
+
+def tokenize(description: str) -> List[str]:
+    """Lowercase words with punctuation and extra whitespace removed"""
+    return re.sub(r"[^\w]+", " ", description.lower()).split()
+
+
+def _content_tokens(tokens: Iterable[str]) -> List[str]:
+    return [t for t in tokens if t not in STOPWORDS and not t.isdigit()]
+
+
+def classify_with_rules(tokens: Iterable[str]) -> Tuple[Optional[str], float]:
+    """Keyword vote; confidence is the winning category's share of all matches"""
+    scores = {}
+    for token in _content_tokens(tokens):
+        for category, keywords in CATEGORY_KEYWORDS.items():
+            if token in keywords:
+                scores[category] = scores.get(category, 0) + 1
+    if not scores:
+        return None, 0.0
+    best = max(scores, key=scores.get)
+    return best, RULE_CONFIDENCE * scores[best] / sum(scores.values())
+
+
+class UserCategoryModel:
+    """Multinomial naive Bayes over description tokens for a single user"""
+
+    MIN_EXAMPLES = 5
+
+    def __init__(self):
+        self.class_counts = {}
+        self.token_counts = {}
+        self.class_token_totals = {}
+        self.vocabulary = set()
+        self.examples = 0
+
+    def observe(self, description: str, category: str):
+        tokens = _content_tokens(tokenize(description))
+        self.examples += 1
+        self.class_counts[category] = self.class_counts.get(category, 0) + 1
+        counts = self.token_counts.setdefault(category, {})
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+            self.vocabulary.add(token)
+        self.class_token_totals[category] = self.class_token_totals.get(category, 0) + len(tokens)
+
+    def predict(self, tokens: Iterable[str]) -> Tuple[Optional[str], float]:
+        tokens = [t for t in _content_tokens(tokens) if t in self.vocabulary]
+        if self.examples < self.MIN_EXAMPLES or not tokens:
+            return None, 0.0
+
+        vocab_size = len(self.vocabulary)
+        log_scores = {}
+        for category, class_count in self.class_counts.items():
+            counts = self.token_counts.get(category, {})
+            denominator = self.class_token_totals.get(category, 0) + vocab_size
+            score = math.log(class_count / self.examples)
+            for token in tokens:
+                score += math.log((counts.get(token, 0) + 1) / denominator)
+            log_scores[category] = score
+
+        best = max(log_scores, key=log_scores.get)
+        # Only trust a class that has actually seen one of these tokens
+        if not any(t in self.token_counts.get(best, {}) for t in tokens):
+            return None, 0.0
+        peak = log_scores[best]
+        normalizer = sum(math.exp(s - peak) for s in log_scores.values())
+        return best, 1.0 / normalizer
+
+
+class LocalClassifier:
+    """Combines the user's model and the keyword rules, preferring the user's own history"""
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+
+    def classify(self, description: str, model: Optional[UserCategoryModel] = None) -> Tuple[Optional[str], float, Optional[str]]:
+        """Return (category, confidence, source); category is None when the LLM should decide"""
+        tokens = tokenize(description)
+        rule_category, rule_confidence = classify_with_rules(tokens)
+        model_category, model_confidence = model.predict(tokens) if model else (None, 0.0)
+
+        if model_category and model_category == rule_category:
+            confidence = max(model_confidence, rule_confidence)
+            if confidence >= self.threshold:
+                return model_category, confidence, "model"
+        elif model_category and model_confidence >= self.threshold:
+            return model_category, model_confidence, "model"
+        if rule_category and rule_confidence >= self.threshold and not model_category:
+            return rule_category, rule_confidence, "rules"
+        return None, max(model_confidence, rule_confidence), None
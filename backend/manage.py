@@ -0,0 +1,146 @@
+"""Maintenance commands for the expense tracker backend.
+
+Usage (from the backend directory):
+    python manage.py rollups verify [--user-id ID]
+    python manage.py rollups rebuild [--user-id ID]
+    python manage.py jobs work [--drain]
+    python manage.py budgets dedupe
+    python manage.py indexes ensure
+    python manage.py indexes check
+    python manage.py migrate storage [--collection NAME] [--batch-size N] [--pause-ms MS] [--restart]
+    python manage.py sync compact [--retention-days N]
+"""
+import argparse
+import asyncio
+import sys
+
+import server
+
+
+async def rollups_verify(args) -> int:
+    drift = await server.verify_rollups(args.user_id)
+    for d in drift:
+        print(
+            f"{d['user_id']} {d['month']} {d['category']}: "
+            f"stored total={d['stored_total']:.2f} count={d['stored_count']}, "
+            f"expected total={d['expected_total']:.2f} count={d['expected_count']}"
+        )
+    print(f"{len(drift)} rollup(s) drifted")
+    return 1 if drift else 0
+
+
+async def rollups_rebuild(args) -> int:
+    count = await server.rebuild_rollups(args.user_id)
+    print(f"Corrected {count} rollup(s)")
+    return 0
+
+
+async def jobs_work(args) -> int:
+    worker = server.categorization_worker
+    await asyncio.gather(*(worker.run(drain=args.drain) for _ in range(worker.concurrency)))
+    stats = worker.stats()
+    print(f"Processed {stats['processed']} job(s), retried {stats['retried']}, abandoned {stats['abandoned']}")
+    return 0
+
+
+async def budgets_dedupe(args) -> int:
+    removed = await server.dedupe_budgets()
+    print(f"Removed {removed} duplicate budget(s)")
+    return 0
+
+
+async def indexes_ensure(args) -> int:
+    result = await server.ensure_indexes()
+    for collection, names in result["created"].items():
+        print(f"{collection}: {', '.join(names)}")
+    for collection, error in result["failed"].items():
+        print(f"FAILED {collection}: {error}")
+    return 1 if result["failed"] else 0
+
+
+async def indexes_check(args) -> int:
+    results = await server.explain_route_queries()
+    for r in results:
+        print(f"{'COLLSCAN' if r['collscan'] else 'ok':>8}  {r['collection']:<20} {r['route']}")
+    scans = [r for r in results if r['collscan']]
+    print(f"{len(scans)} of {len(results)} route queries use a collection scan")
+    return 1 if scans else 0
+
+
+async def migrate_storage(args) -> int:
+    collections = [args.collection] if args.collection else list(server.STORAGE_MIGRATIONS)
+    for collection in collections:
+        counts = await server.migrate_storage(
+            collection, batch_size=args.batch_size, pause=args.pause_ms / 1000, restart=args.restart
+        )
+        print(
+            f"{collection}: scanned {counts['scanned']}, converted {counts['converted']}, "
+            f"left {counts['skipped']} unparseable"
+        )
+    return 0
+
+
+async def sync_compact(args) -> int:
+    removed = await server.compact_tombstones(args.retention_days)
+    print(f"Removed {removed} tombstone(s) older than {args.retention_days} day(s)")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Expense tracker maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rollups = commands.add_parser("rollups", help="Per-user spending rollups")
+    rollup_actions = rollups.add_subparsers(dest="action", required=True)
+    verify = rollup_actions.add_parser("verify", help="Report rollups that differ from raw expenses")
+    verify.add_argument("--user-id", help="Only check this user")
+    verify.set_defaults(handler=rollups_verify)
+    rebuild = rollup_actions.add_parser("rebuild", help="Correct rollups from raw expenses (safe on a live database)")
+    rebuild.add_argument("--user-id", help="Only rebuild this user")
+    rebuild.set_defaults(handler=rollups_rebuild)
+
+    jobs = commands.add_parser("jobs", help="Deferred categorization jobs")
+    job_actions = jobs.add_subparsers(dest="action", required=True)
+    work = job_actions.add_parser("work", help="Run a categorization worker")
+    work.add_argument("--drain", action="store_true", help="Exit once the queue is empty")
+    work.set_defaults(handler=jobs_work)
+
+    budgets = commands.add_parser("budgets", help="Budgets")
+    budget_actions = budgets.add_subparsers(dest="action", required=True)
+    dedupe = budget_actions.add_parser("dedupe", help="Remove duplicate budgets left by concurrent creates, keeping the newest")
+    dedupe.set_defaults(handler=budgets_dedupe)
+
+    indexes = commands.add_parser("indexes", help="Database indexes")
+    index_actions = indexes.add_subparsers(dest="action", required=True)
+    ensure = index_actions.add_parser("ensure", help="Create all declared indexes (idempotent)")
+    ensure.set_defaults(handler=indexes_ensure)
+    check = index_actions.add_parser("check", help="explain() every route query and fail on COLLSCAN")
+    check.set_defaults(handler=indexes_check)
+
+    migrate = commands.add_parser("migrate", help="Data migrations")
+    migrate_actions = migrate.add_subparsers(dest="action", required=True)
+    storage = migrate_actions.add_parser("storage", help="Convert ISO-string dates and float amounts to BSON dates and cents")
+    storage.add_argument("--collection", choices=list(server.STORAGE_MIGRATIONS), help="Only migrate this collection")
+    storage.add_argument("--batch-size", type=int, default=server.MIGRATION_BATCH_SIZE)
+    storage.add_argument("--pause-ms", type=int, default=0, help="Sleep between batches to limit load")
+    storage.add_argument("--restart", action="store_true", help="Ignore the saved checkpoint and start over")
+    storage.set_defaults(handler=migrate_storage)
+
+    sync = commands.add_parser("sync", help="Delta sync bookkeeping")
+    sync_actions = sync.add_subparsers(dest="action", required=True)
+    compact = sync_actions.add_parser("compact", help="Remove old deletion tombstones")
+    compact.add_argument("--retention-days", type=int, default=server.SYNC_TOMBSTONE_RETENTION_DAYS)
+    compact.set_defaults(handler=sync_compact)
+
+    return parser
+
+
+async def run(args) -> int:
+    try:
+        return await args.handler(args)
+    finally:
+        server.close_mongo_client()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(build_parser().parse_args())))
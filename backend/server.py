@@ -1,34 +1,71 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, ValidationError, field_validator
 from typing import List, Optional
 import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
 import jwt
 import json
+import base64
+import math
+import calendar
+from decimal import Decimal, ROUND_HALF_UP
+import hashlib
+import codecs
+import csv
+import time
+import contextvars
+import heapq
+import inspect
+from collections import OrderedDict
+from pydantic_core import PydanticUndefined
+from local_classifier import LocalClassifier, UserCategoryModel, tokenize
 
-# Try to import emergentintegrations, use mock if not available
+# orjson is optional; without it fast responses fall back to the stdlib encoder
 try:
-    from emergentintegrations.llm.chat import LlmChat, UserMessage
+    import orjson
 except ImportError:
-    # Mock classes for when emergentintegrations is not available
-    class UserMessage:
-        def __init__(self, text: str):
-            self.text = text
+    orjson = None
 
-    class LlmChat:
-        def __init__(self, **kwargs):
-            pass
+# The LLM client, Motor, pymongo and passlib are imported on first use rather than at
+# module load: on serverless deployments every cold start pays for module-level imports,
+# and most requests only need JWT verification and one database round trip.
+_llm_classes = None
+
+def llm_classes() -> tuple:
+    """(LlmChat, UserMessage), using a mock when emergentintegrations is not available"""
+    global _llm_classes
+    if _llm_classes is None:
+        try:
+            from emergentintegrations.llm.chat import LlmChat, UserMessage
+        except ImportError:
+            # Mock classes for when emergentintegrations is not available
+            class UserMessage:
+                def __init__(self, text: str):
+                    self.text = text
+
+            class LlmChat:
+                def __init__(self, **kwargs):
+                    pass
+
+                def with_model(self, provider: str, model: str):
+                    return self
 
-        async def run_astream(self, message):
-            yield {"type": "text", "text": "Other"}
+                async def send_message(self, message) -> str:
+                    return "Other"
+
+                async def run_astream(self, message):
+                    yield {"type": "text", "text": "Other"}
+        _llm_classes = (LlmChat, UserMessage)
+    return _llm_classes
 
 ROOT_DIR = Path(__file__).parent
 # Load .env only if it exists (for local development)
@@ -41,17 +78,129 @@ mongo_url = os.environ.get('MONGO_URL')
 if not mongo_url:
     raise RuntimeError("MONGO_URL environment variable is not set")
 
-client = AsyncIOMotorClient(mongo_url)
 db_name = os.environ.get('DB_NAME', 'expense_tracker_db')
-db = client[db_name]
+_client = None
+
+def get_mongo_client():
+    """The process-wide Motor client, created on first use and reused by warm invocations"""
+    global _client
+    if _client is None:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        # tz_aware so stored BSON dates come back in UTC and serialize with their offset
+        _client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+    return _client
+
+def close_mongo_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+class LazyDatabase:
+    """Stands in for the (instrumented) Motor database until a collection is first touched"""
+
+    def _database(self):
+        return InstrumentedDatabase(get_mongo_client()[db_name])
+
+    def __getattr__(self, name):
+        return getattr(self._database(), name)
+
+    def __getitem__(self, name):
+        return self._database()[name]
+
+db = LazyDatabase()
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Pinning min/max rounds to the configured cost makes passlib flag any hash created
+# with a different cost, so login can transparently rehash it (see verify_password_async).
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+_pwd_context = None
+
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=BCRYPT_ROUNDS,
+            bcrypt__min_rounds=BCRYPT_ROUNDS,
+            bcrypt__max_rounds=BCRYPT_ROUNDS,
+        )
+    return _pwd_context
 security = HTTPBearer()
 JWT_SECRET = os.environ.get('JWT_SECRET', 'your_jwt_secret_key')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24 * 7  # 7 days
 
+# Password hashing pool (bcrypt is CPU-bound and must not run on the event loop)
+PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'thread')  # "thread" or "process"
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 64))
+
+# Expense listing
+EXPENSE_PAGE_MAX_LIMIT = 1000
+EXPENSE_STREAM_BATCH_SIZE = int(os.environ.get('EXPENSE_STREAM_BATCH_SIZE', 500))
+EXPENSE_SEARCH_MAX_LIMIT = 200
+EXPENSE_SEARCH_MAX_OFFSET = 10000
+
+# Delta sync: tombstones older than the retention are removed by `manage.py sync compact`,
+# after which clients with an older cursor get a full snapshot. Changes are allocated a
+# sequence number before they are written, so a sync re-reads this many sequence numbers
+# below the cursor to pick up writes that committed out of order.
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+SYNC_RESCAN_WINDOW = int(os.environ.get('SYNC_RESCAN_WINDOW', 20))
+
+# Categorization cache: in-process LRU in front of a Mongo collection shared across instances.
+# The in-process TTL bounds how long an instance can serve an entry invalidated elsewhere.
+CATEGORY_CACHE_SIZE = int(os.environ.get('CATEGORY_CACHE_SIZE', 10000))
+CATEGORY_CACHE_LOCAL_TTL_SECONDS = int(os.environ.get('CATEGORY_CACHE_LOCAL_TTL_SECONDS', 3600))
+CATEGORY_CACHE_SHARED_TTL_SECONDS = int(os.environ.get('CATEGORY_CACHE_SHARED_TTL_SECONDS', 30 * 24 * 3600))
+
+# Local classifier answers without the LLM when it is at least this confident
+LOCAL_CLASSIFIER_THRESHOLD = float(os.environ.get('LOCAL_CLASSIFIER_THRESHOLD', 0.8))
+LOCAL_MODEL_TRAINING_LIMIT = int(os.environ.get('LOCAL_MODEL_TRAINING_LIMIT', 500))
+LOCAL_MODEL_CACHE_SIZE = int(os.environ.get('LOCAL_MODEL_CACHE_SIZE', 1000))
+LOCAL_MODEL_TTL_SECONDS = int(os.environ.get('LOCAL_MODEL_TTL_SECONDS', 3600))
+
+# Coalesce concurrent LLM categorizations into one prompt; a window of 0 disables batching
+CATEGORIZE_BATCH_WINDOW_MS = float(os.environ.get('CATEGORIZE_BATCH_WINDOW_MS', 20))
+CATEGORIZE_BATCH_MAX_SIZE = int(os.environ.get('CATEGORIZE_BATCH_MAX_SIZE', 20))
+
+# Deferred categorization: expenses are stored immediately and categorized by a background worker
+DEFERRED_CATEGORIZATION = os.environ.get('DEFERRED_CATEGORIZATION', 'false').lower() == 'true'
+PENDING_CATEGORY = "Uncategorized"
+CATEGORIZATION_WORKER_ENABLED = os.environ.get('CATEGORIZATION_WORKER_ENABLED', 'true').lower() == 'true'
+CATEGORIZATION_WORKER_CONCURRENCY = int(os.environ.get('CATEGORIZATION_WORKER_CONCURRENCY', 4))
+CATEGORIZATION_WORKER_IDLE_SECONDS = float(os.environ.get('CATEGORIZATION_WORKER_IDLE_SECONDS', 5))
+CATEGORIZATION_JOB_LEASE_SECONDS = int(os.environ.get('CATEGORIZATION_JOB_LEASE_SECONDS', 60))
+CATEGORIZATION_JOB_MAX_ATTEMPTS = int(os.environ.get('CATEGORIZATION_JOB_MAX_ATTEMPTS', 3))
+EXPENSE_POLL_MAX_WAIT_SECONDS = 25
+
+# Bulk import
+BULK_IMPORT_CHUNK_SIZE = int(os.environ.get('BULK_IMPORT_CHUNK_SIZE', 500))
+BULK_IMPORT_MAX_ROWS = int(os.environ.get('BULK_IMPORT_MAX_ROWS', 50000))
+BULK_CATEGORIZE_CONCURRENCY = int(os.environ.get('BULK_CATEGORIZE_CONCURRENCY', 8))
+EXPENSE_BATCH_MAX_ITEMS = 1000
+
+# Create indexes when the app starts (serverless deployments should run manage.py indexes ensure)
+ENSURE_INDEXES_ON_STARTUP = os.environ.get('ENSURE_INDEXES_ON_STARTUP', 'true').lower() == 'true'
+
+# Serve list endpoints straight from trusted Mongo projections, skipping response_model validation
+FAST_JSON_RESPONSES = os.environ.get('FAST_JSON_RESPONSES', 'false').lower() == 'true'
+
+# Log requests slower than this with a breakdown of where the time went (0 disables)
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 0))
+
+# Shared LLM client limits (see LlmClient)
+LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', 30))
+LLM_MAX_CONCURRENCY = int(os.environ.get('LLM_MAX_CONCURRENCY', 16))
+LLM_BREAKER_FAILURES = int(os.environ.get('LLM_BREAKER_FAILURES', 5))
+LLM_BREAKER_RESET_SECONDS = float(os.environ.get('LLM_BREAKER_RESET_SECONDS', 30))
+
+# Number of most recent months of spending summarized for financial advice
+ADVICE_MONTHS = int(os.environ.get('ADVICE_MONTHS', 3))
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
@@ -80,6 +229,20 @@ class ExpenseCreate(BaseModel):
     description: str
     date: str  # YYYY-MM-DD format
 
+    @field_validator("amount")
+    @classmethod
+    def round_to_cents(cls, value: float) -> float:
+        if not math.isfinite(value):
+            raise ValueError("amount must be a finite number")
+        # Amounts are stored as integer cents
+        return to_cents(value) / 100
+
+    @field_validator("date")
+    @classmethod
+    def check_date_format(cls, value: str) -> str:
+        datetime.strptime(value, "%Y-%m-%d")
+        return value
+
 class Expense(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -89,14 +252,36 @@ class Expense(BaseModel):
     description: str
     date: str
     ai_categorized: bool = False
+    category_pending: bool = False
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ExpenseSearchResult(Expense):
+    score: float
+
+class ExpenseCategoryUpdate(BaseModel):
+    id: str
+    category: str = Field(min_length=1)
+
+class ExpenseBatch(BaseModel):
+    delete: List[str] = []
+    recategorize: List[ExpenseCategoryUpdate] = []
+
 class BudgetCreate(BaseModel):
     category: str
     limit: float
     month: int
     year: int
 
+class BudgetLimit(BaseModel):
+    category: str
+    limit: float
+
+class BudgetMonthUpdate(BaseModel):
+    month: int
+    year: int
+    budgets: List[BudgetLimit]
+    replace: bool = False  # remove this month's budgets for categories not listed
+
 class Budget(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -124,13 +309,365 @@ class DashboardStats(BaseModel):
     monthly_trend: List[dict]
     category_breakdown: List[dict]
 
+# ==================== Metrics ====================
+# Process-local metrics in Prometheus text format (GET /api/metrics): request latency per
+# route, Motor operation latency and document counts, and LLM call latency, token estimates
+# and failures. Each request also collects a breakdown of its own database/LLM/hashing time
+# for the slow-request log.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+METRIC_HELP = {
+    "http_request_duration_seconds": ("histogram", "API request latency by route template"),
+    "http_requests_total": ("counter", "API requests by route template and status"),
+    "mongo_operation_duration_seconds": ("histogram", "Motor operation latency"),
+    "mongo_operation_documents_total": ("counter", "Documents returned or written by Motor operations"),
+    "llm_call_duration_seconds": ("histogram", "LLM call latency"),
+    "llm_calls_total": ("counter", "LLM calls by outcome"),
+    "llm_tokens_estimated_total": ("counter", "Estimated LLM tokens (4 characters per token)"),
+}
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+def format_labels(labels: tuple, **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name: str, labels: dict, value: float):
+        key = (name, tuple(labels.items()))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def inc(self, name: str, labels: dict, amount: float = 1):
+        key = (name, tuple(labels.items()))
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def render(self) -> str:
+        lines = []
+        for name, (kind, help_text) in METRIC_HELP.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (metric, labels), h in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(h.buckets, h.counts):
+                        lines.append(f"{name}_bucket{format_labels(labels, le=bound)} {count}")
+                    lines.append(f"{name}_bucket{format_labels(labels, le='+Inf')} {h.count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {h.sum}")
+                    lines.append(f"{name}_count{format_labels(labels)} {h.count}")
+            else:
+                for (metric, labels), value in sorted(self.counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+class RequestTimings:
+    """Where one request spent its time, by phase (db, llm, password_hash)"""
+
+    # Only the slowest operations are reported, so that is all that is kept
+    MAX_OPERATIONS = 20
+
+    def __init__(self):
+        self.phases = {}
+        self.operations = []  # min-heap of (seconds, label)
+
+    def add(self, phase: str, label: str, seconds: float):
+        total, calls = self.phases.get(phase, (0.0, 0))
+        self.phases[phase] = (total + seconds, calls + 1)
+        if len(self.operations) < self.MAX_OPERATIONS:
+            heapq.heappush(self.operations, (seconds, f"{phase} {label}"))
+        else:
+            heapq.heappushpop(self.operations, (seconds, f"{phase} {label}"))
+
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+def record_phase(phase: str, label: str, seconds: float):
+    timings = request_timings.get()
+    if timings is not None:
+        timings.add(phase, label, seconds)
+
+def estimate_tokens(text: str) -> int:
+    return len(text or "") // 4 + 1
+
+def record_llm_call(purpose: str, seconds: float, prompt: str, completion: Optional[str], ok: bool):
+    metrics.observe("llm_call_duration_seconds", {"purpose": purpose}, seconds)
+    metrics.inc("llm_calls_total", {"purpose": purpose, "outcome": "ok" if ok else "error"})
+    metrics.inc("llm_tokens_estimated_total", {"purpose": purpose, "direction": "prompt"}, estimate_tokens(prompt))
+    if completion:
+        metrics.inc("llm_tokens_estimated_total", {"purpose": purpose, "direction": "completion"}, estimate_tokens(completion))
+    record_phase("llm", purpose, seconds)
+
+def result_document_count(result) -> int:
+    """Documents read or written according to a Motor result"""
+    if result is None or isinstance(result, (int, float, str)):
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return 1
+    if hasattr(result, "inserted_ids"):
+        return len(result.inserted_ids)
+    if hasattr(result, "inserted_id"):
+        return 1
+    if hasattr(result, "upserted_count"):
+        return result.inserted_count + result.modified_count + result.deleted_count + result.upserted_count
+    if hasattr(result, "modified_count"):
+        return result.modified_count + (1 if result.upserted_id is not None else 0)
+    if hasattr(result, "deleted_count"):
+        return result.deleted_count
+    return 0
+
+def record_db_operation(collection: str, operation: str, seconds: float, documents: int):
+    labels = {"collection": collection, "operation": operation}
+    metrics.observe("mongo_operation_duration_seconds", labels, seconds)
+    metrics.inc("mongo_operation_documents_total", labels, documents)
+    record_phase("db", f"{collection}.{operation}", seconds)
+
+class InstrumentedCursor:
+    """Times to_list() and async iteration of a Motor cursor; chaining methods pass through"""
+
+    def __init__(self, cursor, collection: str, operation: str):
+        self._cursor = cursor
+        self._collection = collection
+        self._operation = operation
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self._cursor else result
+        return call
+
+    async def to_list(self, length=None):
+        started = time.perf_counter()
+        docs = await self._cursor.to_list(length)
+        record_db_operation(self._collection, self._operation, time.perf_counter() - started, len(docs))
+        return docs
+
+    async def __aiter__(self):
+        elapsed, count = 0.0, 0
+        iterator = self._cursor.__aiter__()
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    doc = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - started
+                count += 1
+                yield doc
+        finally:
+            record_db_operation(self._collection, self._operation, elapsed, count)
+
+class InstrumentedCollection:
+    CURSOR_METHODS = {"find", "aggregate"}
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if name in self.CURSOR_METHODS:
+            return lambda *args, **kwargs: InstrumentedCursor(attr(*args, **kwargs), self._collection.name, name)
+        if name.startswith("_") or not inspect.ismethod(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            if not inspect.isawaitable(result):
+                return result
+            return self._timed(name, result)
+        return call
+
+    async def _timed(self, operation: str, awaitable):
+        started = time.perf_counter()
+        result = await awaitable
+        record_db_operation(self._collection.name, operation, time.perf_counter() - started, result_document_count(result))
+        return result
+
+class InstrumentedDatabase:
+    """Wraps a Motor (or compatible) database so every collection operation is timed"""
+
+    def __init__(self, database):
+        self._database = database
+
+    def __getattr__(self, name):
+        attr = getattr(self._database, name)
+        if name.startswith("_") or inspect.ismethod(attr) or not hasattr(attr, "insert_one"):
+            return attr
+        return InstrumentedCollection(attr)
+
+    def __getitem__(self, name):
+        return InstrumentedCollection(self._database[name])
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency per route template until the response body is sent"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = request_timings.set(timings)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            request_timings.reset(token)
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            # Unmatched paths share one label so arbitrary URLs cannot grow the registry
+            path = route.path if route is not None else "unmatched"
+            metrics.observe("http_request_duration_seconds", {"method": scope["method"], "route": path}, elapsed)
+            metrics.inc("http_requests_total", {"method": scope["method"], "route": path, "status": status_code})
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                log_slow_request(scope["method"], path, status_code, elapsed, timings)
+
+def log_slow_request(method: str, path: str, status_code: int, elapsed: float, timings: RequestTimings):
+    accounted = 0.0
+    parts = []
+    for phase, (seconds, calls) in sorted(timings.phases.items()):
+        accounted += seconds
+        parts.append(f"{phase} {seconds * 1000:.0f} ms in {calls} call(s)")
+    parts.append(f"other {max(0.0, elapsed - accounted) * 1000:.0f} ms")
+    slowest = ", ".join(f"{label} {seconds * 1000:.0f} ms" for seconds, label in sorted(timings.operations, reverse=True)[:5])
+    logging.warning(
+        f"Slow request {method} {path} -> {status_code} took {elapsed * 1000:.0f} ms "
+        f"({'; '.join(parts)})" + (f"; slowest: {slowest}" if slowest else "")
+    )
+
 # ==================== Helper Functions ====================
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str):
+    """Return (valid, new_hash); new_hash is set when the stored hash uses an outdated cost"""
+    return get_pwd_context().verify_and_update(plain_password, hashed_password)
+
+class PasswordHashPool:
+    """Runs bcrypt work on a bounded worker pool and tracks queue depth"""
+
+    def __init__(self, kind: str, workers: int, max_pending: int):
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_pending = max_pending
+        self._executor = None
+        self._semaphore = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwhash")
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._executor
+
+    async def run(self, fn, *args):
+        executor = self._get_executor()
+        if self.waiting >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy, please retry")
+
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        started_at = loop.time()
+        self.total_wait_seconds += started_at - queued_at
+        self.in_flight += 1
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_run_seconds += loop.time() - started_at
+            record_phase("password_hash", fn.__name__, loop.time() - queued_at)
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_wait_ms": (self.total_wait_seconds / self.completed * 1000) if self.completed else 0,
+            "avg_run_ms": (self.total_run_seconds / self.completed * 1000) if self.completed else 0,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+password_pool = PasswordHashPool(PASSWORD_HASH_EXECUTOR, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+
+async def hash_password_async(password: str) -> str:
+    return await password_pool.run(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str):
+    return await password_pool.run(verify_and_update_password, plain_password, hashed_password)
 
 def create_token(user_id: str) -> str:
     expiration = datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
@@ -150,77 +687,1340 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
 
-async def categorize_expense_with_ai(description: str, amount: float) -> str:
-    """Use AI to categorize expense based on description and amount"""
+# ==================== Storage Format ====================
+# Timestamps and expense dates are stored as native BSON dates and amounts as integer
+# cents. Documents written before that (ISO strings, float amounts) stay readable until
+# `manage.py migrate storage` has converted them, so read paths accept both formats.
+
+# Legacy float amounts make sums fractional, so callers round the summed cents
+AMOUNT_CENTS_EXPR = {"$ifNull": ["$amount_cents", {"$multiply": ["$amount", 100]}]}
+MONTH_EXPR = {"$cond": [
+    {"$eq": [{"$type": "$date"}, "date"]},
+    {"$dateToString": {"format": "%Y-%m", "date": "$date"}},
+    {"$substr": ["$date", 0, 7]}
+]}
+
+def to_cents(amount: float) -> int:
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def expense_date_to_bson(date: str) -> datetime:
+    return datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+def expense_to_doc(expense: "Expense") -> dict:
+    """Storage document for an expense"""
+    doc = expense.model_dump()
+    doc['amount_cents'] = to_cents(doc.pop('amount'))
+    doc['date'] = expense_date_to_bson(doc['date'])
+    return doc
+
+def expense_from_doc(doc: dict) -> dict:
+    """API shape (float amount, YYYY-MM-DD date, datetime created_at) of a stored expense in either format"""
+    if 'amount_cents' in doc:
+        doc['amount'] = doc.pop('amount_cents') / 100
+    if isinstance(doc.get('date'), datetime):
+        doc['date'] = doc['date'].strftime("%Y-%m-%d")
+    if isinstance(doc.get('created_at'), str):
+        doc['created_at'] = datetime.fromisoformat(doc['created_at'])
+    return doc
+
+# ==================== Fast Responses ====================
+# With FAST_JSON_RESPONSES the list endpoints project exactly their model's fields from
+# Mongo and encode the dicts directly, instead of FastAPI instantiating and re-validating
+# one model per row. Only documents written by this API are served this way.
+
+def encode_json_default(value):
+    if isinstance(value, datetime):
+        # The same form Pydantic response models use, with UTC written as "Z"
+        text = value.isoformat()
+        return text[:-6] + "Z" if text.endswith("+00:00") else text
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps_json(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+    return json.dumps(content, default=encode_json_default, separators=(",", ":")).encode()
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps_json(content)
+
+def carry_headers(target: Response, source: Response) -> Response:
+    """Copy headers a route set on its injected Response onto the response it returns"""
+    for name, value in source.headers.items():
+        if name not in ("content-length", "content-type"):
+            target.headers[name] = value
+    return target
+
+def trusted_projection(model, **extra) -> dict:
+    """Mongo projection of exactly the model's fields"""
+    return {"_id": 0, **{name: 1 for name in model.model_fields}, **extra}
+
+def model_defaults(model) -> dict:
+    """Plain defaults for fields that older documents may be missing"""
+    return {name: f.default for name, f in model.model_fields.items() if f.default is not PydanticUndefined}
+
+def encode_expense_cursor(expense: dict) -> str:
+    """Build an opaque keyset cursor from the stored (date, id) of the last returned expense"""
+    date = expense['date']
+    if isinstance(date, datetime):
+        raw = [date.strftime("%Y-%m-%d"), expense['id'], "date"]
+    else:
+        raw = [date, expense['id']]
+    return base64.urlsafe_b64encode(json.dumps(raw).encode()).decode().rstrip("=")
+
+def decode_expense_cursor(cursor: str) -> tuple:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(raw, list):
+            raise ValueError("cursor must be a list")
+        date, expense_id, *kind = raw
+        if not isinstance(date, str) or not isinstance(expense_id, str):
+            raise ValueError("cursor fields must be strings")
+        if kind == ["date"]:
+            date = expense_date_to_bson(date)
+        return date, expense_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def expense_page_query(user_id: str, after: Optional[str]) -> dict:
+    """Keyset filter for expenses sorted by (date desc, id desc)"""
+    query = {"user_id": user_id}
+    if after:
+        date, expense_id = decode_expense_cursor(after)
+        query["$or"] = [
+            {"date": {"$lt": date}},
+            {"date": date, "id": {"$lt": expense_id}},
+        ]
+        if isinstance(date, datetime):
+            # BSON orders dates after strings, so unmigrated rows come after every migrated one
+            query["$or"].append({"date": {"$type": "string"}})
+    return query
+
+EXPENSE_SORT = [("date", -1), ("id", -1)]
+EXPENSE_PROJECTION = trusted_projection(Expense, amount_cents=1)
+EXPENSE_DEFAULTS = model_defaults(Expense)
+
+def parse_date_param(value: str, name: str) -> datetime:
     try:
-        llm_key = os.environ.get('EMERGENT_LLM_KEY')
-        chat = LlmChat(
-            api_key=llm_key,
-            session_id="expense_categorization",
-            system_message="You are an expense categorization assistant. Categorize expenses into one of these categories ONLY: Food, Transportation, Shopping, Entertainment, Bills, Healthcare, Education, Other. Return only the category name, nothing else."
-        ).with_model("openai", "gpt-4o")
-        
-        message = UserMessage(text=f"Categorize this expense: '{description}' (Amount: ${amount})")
-        response = await chat.send_message(message)
-        
-        category = response.strip()
-        valid_categories = ["Food", "Transportation", "Shopping", "Entertainment", "Bills", "Healthcare", "Education", "Other"]
-        
-        if category in valid_categories:
+        return expense_date_to_bson(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a date in YYYY-MM-DD format")
+
+def expense_filter_clauses(
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    category: Optional[str] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None
+) -> list:
+    """Mongo clauses for the optional list filters, matching both stored formats"""
+    clauses = []
+    if date_from or date_to:
+        as_date, as_string = {}, {}
+        if date_from:
+            as_date["$gte"] = parse_date_param(date_from, "from")
+            as_string["$gte"] = date_from
+        if date_to:
+            as_date["$lte"] = parse_date_param(date_to, "to")
+            as_string["$lte"] = date_to
+        clauses.append({"$or": [{"date": as_date}, {"date": as_string}]})
+    if category:
+        clauses.append({"category": category})
+    if min_amount is not None or max_amount is not None:
+        in_cents, as_float = {}, {}
+        if min_amount is not None:
+            in_cents["$gte"] = to_cents(min_amount)
+            as_float["$gte"] = min_amount
+        if max_amount is not None:
+            in_cents["$lte"] = to_cents(max_amount)
+            as_float["$lte"] = max_amount
+        clauses.append({"$or": [{"amount_cents": in_cents}, {"amount": as_float}]})
+    return clauses
+
+def with_clauses(query: dict, clauses: list) -> dict:
+    """AND extra clauses into a query, keeping user_id at the top level for the planner"""
+    if not clauses:
+        return query
+    query = dict(query)
+    combined = list(clauses)
+    if "$or" in query:
+        combined.append({"$or": query.pop("$or")})
+    query["$and"] = combined
+    return query
+
+def expense_fields_projection(fields: str) -> tuple:
+    """(projection, requested field names) for a comma-separated ?fields= list"""
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = sorted(set(requested) - set(Expense.model_fields))
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(Expense.model_fields)}"
+        )
+    # id and date are always read: the next-page cursor is built from them
+    projection = {"_id": 0, "id": 1, "date": 1}
+    for name in requested:
+        projection[name] = 1
+        if name == "amount":
+            projection["amount_cents"] = 1
+    return projection, ["id", *[f for f in requested if f != "id"]]
+
+# ==================== Spending Rollups ====================
+# spending_rollups holds one document per (user_id, month, category) with the running
+# total and count of that user's expenses, kept current by create/delete with $inc.
+# Totals are accumulated in integer total_cents; rollups created before that may also
+# carry a float total, and the two are added together when read.
+# Users who had expenses before rollups existed only have complete rollups once
+# `manage.py rollups rebuild` has set rollups_built on their user document; until then
+# readers compute the same figures from raw expenses. New users start with it set.
+
+# Float totals from before integer cents may be off by a rounding step
+ROLLUP_TOLERANCE_CENTS = 1
+# Passes rebuild_rollups makes when concurrent writes keep changing the rollups it corrects
+ROLLUP_REBUILD_ATTEMPTS = 5
+
+def rollup_key(user_id: str, expense_date: str, category: str) -> dict:
+    return {"user_id": user_id, "month": expense_date[:7], "category": category}
+
+async def apply_expense_to_rollups(user_id: str, expense_date: str, category: str, amount: float, count: int = 1):
+    """Add (count=1) or remove (count=-1) an expense from the user's rollups"""
+    await db.spending_rollups.update_one(
+        rollup_key(user_id, expense_date, category),
+        {"$inc": {"total_cents": to_cents(amount) * count, "count": count}},
+        upsert=True
+    )
+
+async def apply_expenses_to_rollups(user_id: str, expenses: list, count: int = 1, removed: list = ()):
+    """Batch version of apply_expense_to_rollups: one bulk_write for many expenses.
+
+    ``expenses`` are applied with ``count``; ``removed`` are always subtracted, so a batch
+    that moves expenses between categories still needs only one round trip.
+    """
+    from pymongo import UpdateOne
+    increments = {}
+    for exp, sign in [(e, count) for e in expenses] + [(e, -1) for e in removed]:
+        key = (exp['date'][:7], exp['category'])
+        cents, n = increments.get(key, (0, 0))
+        increments[key] = (cents + to_cents(exp['amount']) * sign, n + sign)
+    increments = {key: value for key, value in increments.items() if value != (0, 0)}
+    if not increments:
+        return
+    await db.spending_rollups.bulk_write([
+        UpdateOne(
+            {"user_id": user_id, "month": month, "category": category},
+            {"$inc": {"total_cents": cents, "count": n}},
+            upsert=True
+        )
+        for (month, category), (cents, n) in increments.items()
+    ], ordered=False)
+
+def rollup_total_cents(rollup: dict) -> int:
+    return rollup.get('total_cents', 0) + round(rollup.get('total', 0) * 100)
+
+async def rollups_ready(user_id: str) -> bool:
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "rollups_built": 1})
+    return bool(user and user.get("rollups_built"))
+
+async def get_user_rollups(user_id: str) -> list:
+    """The user's non-empty rollups, each with a combined float total"""
+    if not await rollups_ready(user_id):
+        expected = await compute_rollups_from_expenses(user_id)
+        return [
+            {"month": month, "category": category, "total": v["total_cents"] / 100, "count": v["count"]}
+            for (_, month, category), v in expected.items() if v["count"] > 0
+        ]
+    return await get_stored_rollups(user_id)
+
+async def get_stored_rollups(user_id: str) -> list:
+    rollups = await db.spending_rollups.find(
+        {"user_id": user_id, "count": {"$gt": 0}},
+        {"_id": 0, "month": 1, "category": 1, "total": 1, "total_cents": 1, "count": 1}
+    ).to_list(None)
+    for r in rollups:
+        r['total'] = rollup_total_cents(r) / 100
+        r.pop('total_cents', None)
+    return rollups
+
+def dashboard_stats_from_rollups(rollups: list) -> dict:
+    category_totals = {}
+    monthly_totals = {}
+    for r in rollups:
+        category_totals[r['category']] = category_totals.get(r['category'], 0) + r['total']
+        monthly_totals[r['month']] = monthly_totals.get(r['month'], 0) + r['total']
+
+    category_breakdown = [{"category": k, "amount": v} for k, v in category_totals.items()]
+    category_breakdown.sort(key=lambda x: (-x['amount'], x['category']))
+    return {
+        "total_expenses": sum(r['total'] for r in rollups),
+        "expense_count": sum(r['count'] for r in rollups),
+        "top_category": category_breakdown[0]['category'] if category_breakdown else "None",
+        "monthly_trend": [{"month": k, "amount": v} for k, v in sorted(monthly_totals.items())[-6:]],
+        "category_breakdown": category_breakdown
+    }
+
+async def compute_rollups_from_expenses(user_id: Optional[str] = None) -> dict:
+    """Recompute rollups from raw expenses, keyed by (user_id, month, category)"""
+    pipeline = [
+        {"$group": {
+            "_id": {"user_id": "$user_id", "month": MONTH_EXPR, "category": "$category"},
+            "total_cents": {"$sum": AMOUNT_CENTS_EXPR},
+            "count": {"$sum": 1}
+        }}
+    ]
+    if user_id:
+        pipeline.insert(0, {"$match": {"user_id": user_id}})
+    expected = {}
+    async for row in db.expenses.aggregate(pipeline, allowDiskUse=True):
+        key = (row['_id']['user_id'], row['_id']['month'], row['_id']['category'])
+        expected[key] = {"total_cents": round(row['total_cents']), "count": row['count']}
+    return expected
+
+async def verify_rollups(user_id: Optional[str] = None) -> list:
+    """Compare stored rollups with raw expenses and return one entry per drifted key"""
+    expected = await compute_rollups_from_expenses(user_id)
+    stored = {}
+    async for r in db.spending_rollups.find({"user_id": user_id} if user_id else {}, {"_id": 0}):
+        stored[(r['user_id'], r['month'], r['category'])] = {"total_cents": rollup_total_cents(r), "count": r.get('count', 0)}
+
+    drift = []
+    for key in sorted(set(expected) | set(stored)):
+        want = expected.get(key, {"total_cents": 0, "count": 0})
+        have = stored.get(key, {"total_cents": 0, "count": 0})
+        if want['count'] != have['count'] or abs(want['total_cents'] - have['total_cents']) > ROLLUP_TOLERANCE_CENTS:
+            drift.append({
+                "user_id": key[0], "month": key[1], "category": key[2],
+                "expected_total": want['total_cents'] / 100, "stored_total": have['total_cents'] / 100,
+                "expected_count": want['count'], "stored_count": have['count']
+            })
+    return drift
+
+async def rebuild_rollups(user_id: Optional[str] = None) -> int:
+    """Correct stored rollups to match raw expenses, then mark the users as built.
+
+    Safe while the app is taking writes: each stored rollup is read before the expenses are
+    summed, and every correction only applies if that rollup is still unchanged, so a
+    concurrent $inc is never overwritten. Rollups that changed underneath are corrected on
+    the next pass. Users whose rollups were corrected get a new data version, so cached
+    dashboards are fetched again. Returns the number of rollups corrected.
+    """
+    from pymongo import DeleteOne, UpdateOne
+    from pymongo.errors import BulkWriteError
+    scope = {"user_id": user_id} if user_id else {}
+    corrected = 0
+    changed_users = set()
+    for _ in range(ROLLUP_REBUILD_ATTEMPTS):
+        stored = {}
+        async for r in db.spending_rollups.find(scope):
+            stored[(r['user_id'], r['month'], r['category'])] = r
+        expected = await compute_rollups_from_expenses(user_id)
+
+        operations = []
+        for key in set(stored) | set(expected):
+            want, have = expected.get(key), stored.get(key)
+            operation = None
+            if have is None:
+                # Only creates the rollup if no write has created it meanwhile
+                operation = UpdateOne(
+                    {"user_id": key[0], "month": key[1], "category": key[2]},
+                    {"$setOnInsert": want}, upsert=True
+                )
+            else:
+                unchanged = {"_id": have["_id"], **{f: have.get(f) for f in ("total_cents", "total", "count")}}
+                if want is None:
+                    if have.get("count") or rollup_total_cents(have):
+                        operation = DeleteOne(unchanged)
+                elif want["count"] != have.get("count") or want["total_cents"] != rollup_total_cents(have) or "total" in have:
+                    operation = UpdateOne(unchanged, {"$set": want, "$unset": {"total": ""}})
+            if operation is not None:
+                operations.append(operation)
+                changed_users.add(key[0])
+        if not operations:
+            break
+
+        try:
+            result = await db.spending_rollups.bulk_write(operations, ordered=False)
+            applied = result.upserted_count + result.modified_count + result.deleted_count
+        except BulkWriteError as e:
+            # A concurrent write created one of the missing rollups first
+            applied = e.details.get("nUpserted", 0) + e.details.get("nModified", 0) + e.details.get("nRemoved", 0)
+        corrected += applied
+        if applied == len(operations):
+            break
+    else:
+        raise RuntimeError(f"Rollups kept changing during rebuild after {ROLLUP_REBUILD_ATTEMPTS} passes; run it again")
+
+    if user_id:
+        await db.users.update_one({"id": user_id}, {"$set": {"rollups_built": True}})
+    else:
+        await db.users.update_many({}, {"$set": {"rollups_built": True}})
+    for changed in changed_users:
+        await bump_data_version(changed)
+    return corrected
+
+VALID_CATEGORIES = ["Food", "Transportation", "Shopping", "Entertainment", "Bills", "Healthcare", "Education", "Other"]
+
+def normalize_description(description: str) -> str:
+    """Cache key for a description: lowercase words with punctuation and extra spaces removed"""
+    return " ".join(tokenize(description))
+
+class LRUTTLCache:
+    """Small in-process LRU cache whose entries also expire after a fixed TTL"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+class CategorizationCache:
+    """Two-level cache of AI categorizations keyed on the normalized description"""
+
+    def __init__(self):
+        self.local = LRUTTLCache(CATEGORY_CACHE_SIZE, CATEGORY_CACHE_LOCAL_TTL_SECONDS)
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        category = self.local.get(key)
+        if category:
+            self.local_hits += 1
             return category
-        return "Other"
+
+        doc = await db.category_cache.find_one(
+            {"key": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"_id": 0, "category": 1}
+        )
+        if doc:
+            self.shared_hits += 1
+            self.local.set(key, doc['category'])
+            return doc['category']
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, category: str):
+        self.local.set(key, category)
+        now = datetime.now(timezone.utc)
+        await db.category_cache.update_one(
+            {"key": key},
+            {"$set": {
+                "category": category,
+                "updated_at": now,
+                "expires_at": now + timedelta(seconds=CATEGORY_CACHE_SHARED_TTL_SECONDS)
+            }},
+            upsert=True
+        )
+
+    async def invalidate(self, key: str, unless_category: Optional[str] = None):
+        """Remove key from both levels; with unless_category, keep entries that already agree"""
+        local = self.local.get(key)
+        if unless_category is not None and local == unless_category:
+            # The local level mirrors the shared entry it was filled from, so nothing to undo
+            return
+        self.local.delete(key)
+        query = {"key": key}
+        if unless_category is not None:
+            query["category"] = {"$ne": unless_category}
+        result = await db.category_cache.delete_one(query)
+        if result.deleted_count:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": ((self.local_hits + self.shared_hits) / lookups) if lookups else 0,
+            "invalidations": self.invalidations,
+            "local_size": len(self.local)
+        }
+
+category_cache = CategorizationCache()
+
+class LocalCategorizer:
+    """Keyword rules plus per-user models trained on each user's categorized expenses"""
+
+    def __init__(self):
+        self.classifier = LocalClassifier(LOCAL_CLASSIFIER_THRESHOLD)
+        self.models = LRUTTLCache(LOCAL_MODEL_CACHE_SIZE, LOCAL_MODEL_TTL_SECONDS)
+        self.rule_hits = 0
+        self.model_hits = 0
+        self.deferred = 0
+
+    async def get_model(self, user_id: str) -> UserCategoryModel:
+        model = self.models.get(user_id)
+        if model is None:
+            model = UserCategoryModel()
+            # Pending rows sit under the placeholder category, which is not a real label
+            history = await db.expenses.find(
+                {"user_id": user_id, "category_pending": {"$ne": True}, "category": {"$ne": PENDING_CATEGORY}},
+                {"_id": 0, "description": 1, "category": 1}
+            ).sort("created_at", -1).limit(LOCAL_MODEL_TRAINING_LIMIT).to_list(LOCAL_MODEL_TRAINING_LIMIT)
+            for exp in history:
+                model.observe(exp['description'], exp['category'])
+            self.models.set(user_id, model)
+        return model
+
+    async def categorize(self, description: str, user_id: Optional[str]) -> Optional[str]:
+        model = await self.get_model(user_id) if user_id else None
+        category, _, source = self.classifier.classify(description, model)
+        if category == PENDING_CATEGORY:
+            category, source = None, None
+        if source == "model":
+            self.model_hits += 1
+        elif source == "rules":
+            self.rule_hits += 1
+        else:
+            self.deferred += 1
+        return category
+
+    def observe(self, user_id: str, description: str, category: str):
+        """Teach an already loaded user model about a newly categorized expense"""
+        model = self.models.get(user_id)
+        if model is not None and category != PENDING_CATEGORY:
+            model.observe(description, category)
+
+    def stats(self) -> dict:
+        answered = self.rule_hits + self.model_hits
+        total = answered + self.deferred
+        return {
+            "threshold": LOCAL_CLASSIFIER_THRESHOLD,
+            "rule_hits": self.rule_hits,
+            "model_hits": self.model_hits,
+            "deferred_to_llm": self.deferred,
+            "llm_calls_avoided": (answered / total) if total else 0,
+            "loaded_models": len(self.models)
+        }
+
+local_categorizer = LocalCategorizer()
+
+# ==================== Data Versions ====================
+# Each user document carries data_version, incremented by every write that changes what
+# the expense, budget or dashboard endpoints return. Those endpoints send an ETag built
+# from it and answer a matching If-None-Match with 304 after reading only the user
+# document.
+
+async def bump_data_version(user_id: str):
+    await db.users.update_one({"id": user_id}, {"$inc": {"data_version": 1}})
+
+async def next_change_seq(user_id: str, count: int = 1) -> int:
+    """Reserve ``count`` change sequence numbers for the user; returns the highest.
+
+    Documents written with these numbers in ``seq`` are what GET /sync returns. Unlike
+    data_version this is taken before the write, so the number can go on the document.
+    """
+    from pymongo import ReturnDocument
+    user = await db.users.find_one_and_update(
+        {"id": user_id}, {"$inc": {"change_seq": count}},
+        projection={"change_seq": 1}, return_document=ReturnDocument.AFTER
+    )
+    return (user or {}).get("change_seq", 0)
+
+async def record_tombstones(user_id: str, collection: str, ids: list, seq: int):
+    """Remember deleted documents so GET /sync can tell clients to drop them"""
+    if ids:
+        now = datetime.now(timezone.utc)
+        await db.tombstones.insert_many([
+            {"user_id": user_id, "collection": collection, "id": doc_id, "seq": seq, "deleted_at": now}
+            for doc_id in ids
+        ])
+
+async def get_data_version(user_id: str) -> int:
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "data_version": 1})
+    return (user or {}).get("data_version", 0)
+
+def data_etag(request: Request, user_id: str, version: int) -> str:
+    # The user and query string are hashed in so a browser cache shared by two accounts,
+    # or two filtered views of one account, never matches the wrong representation
+    scope = hashlib.sha1(f"{user_id}|{request.url.path}|{request.url.query}".encode()).hexdigest()[:16]
+    return f'W/"{version}-{scope}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+async def check_not_modified(request: Request, response: Response, user_id: str) -> Optional[Response]:
+    """A 304 response if the client's copy is current; otherwise set the ETag on ``response``.
+
+    The version is read before the data, so a write racing the read can only leave the
+    client with an older ETag, which just costs one extra full response.
+    """
+    etag = data_etag(request, user_id, await get_data_version(user_id))
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Authorization"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+# ==================== LLM Client ====================
+# One shared LlmClient per (provider, model, system prompt). All clients share a global
+# concurrency limit, every call has a deadline, and each client has a circuit breaker that
+# rejects calls immediately while the provider keeps failing, so callers fall back ("Other",
+# stored advice) instead of piling up behind a slow provider.
+
+class LlmUnavailable(Exception):
+    """Raised without calling the provider while the circuit breaker is open"""
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures; after reset_seconds one trial call is let through"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.trial_in_flight or self.consecutive_failures >= self.failure_threshold:
+            if self.opened_at is None or self.trial_in_flight:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+    def release_trial(self):
+        # A trial call that ended without a verdict (e.g. the caller went away) frees the slot
+        self.trial_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
+
+_llm_slots = None
+
+def llm_slots() -> asyncio.Semaphore:
+    # Created lazily so it binds to the running event loop
+    global _llm_slots
+    if _llm_slots is None:
+        _llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_slots
+
+def stream_chunk_text(chunk) -> str:
+    """Text of one run_astream chunk ({"type": "text", "text": ...} or a plain string)"""
+    if isinstance(chunk, str):
+        return chunk
+    if isinstance(chunk, dict) and chunk.get("type", "text") == "text":
+        return chunk.get("text") or ""
+    return ""
+
+class LlmClient:
+    def __init__(self, session_id: str, system_message: str, provider: str = "openai", model: str = "gpt-4o"):
+        self.session_id = session_id
+        self.system_message = system_message
+        self.provider = provider
+        self.model = model
+        self.breaker = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_SECONDS)
+        self.in_flight = 0
+        self.timeouts = 0
+
+    def _chat(self):
+        # A chat object carries session state, so each call gets its own; it holds no connection
+        LlmChat, _ = llm_classes()
+        chat = LlmChat(api_key=os.environ.get('EMERGENT_LLM_KEY'), session_id=self.session_id, system_message=self.system_message)
+        return chat.with_model(self.provider, self.model) if hasattr(chat, "with_model") else chat
+
+    def _admit(self, purpose: str):
+        if not self.breaker.allow():
+            metrics.inc("llm_calls_total", {"purpose": purpose, "outcome": "rejected"})
+            raise LlmUnavailable(f"LLM circuit open for {purpose}")
+
+    async def send(self, purpose: str, text: str) -> str:
+        """Complete one prompt within LLM_TIMEOUT_SECONDS (including the wait for a free slot)"""
+        self._admit(purpose)
+        _, UserMessage = llm_classes()
+        message = UserMessage(text=text)
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await asyncio.wait_for(self._send(message), LLM_TIMEOUT_SECONDS)
+            self.breaker.record_success()
+            return response
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.breaker.record_failure()
+            raise asyncio.TimeoutError(f"LLM call for {purpose} exceeded {LLM_TIMEOUT_SECONDS}s") from None
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.breaker.release_trial()
+            record_llm_call(purpose, time.perf_counter() - started, text, response, ok=response is not None)
+
+    async def _send(self, message) -> str:
+        async with llm_slots():
+            self.in_flight += 1
+            try:
+                chat = self._chat()
+                if hasattr(chat, "send_message"):
+                    return await chat.send_message(message)
+                # Clients that only stream (such as the bundled mock): collect the chunks
+                return "".join([stream_chunk_text(chunk) async for chunk in chat.run_astream(message)])
+            finally:
+                self.in_flight -= 1
+
+    async def stream(self, purpose: str, text: str):
+        """Yield text pieces as they arrive; the whole stream shares one LLM_TIMEOUT_SECONDS deadline"""
+        self._admit(purpose)
+        _, UserMessage = llm_classes()
+        deadline = time.monotonic() + LLM_TIMEOUT_SECONDS
+        started = time.perf_counter()
+        parts = []
+        ok = False
+        try:
+            await asyncio.wait_for(llm_slots().acquire(), LLM_TIMEOUT_SECONDS)
+            self.in_flight += 1
+            try:
+                chunks = self._chat().run_astream(UserMessage(text=text)).__aiter__()
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), max(0.001, deadline - time.monotonic()))
+                    except StopAsyncIteration:
+                        break
+                    piece = stream_chunk_text(chunk)
+                    if piece:
+                        parts.append(piece)
+                        yield piece
+            finally:
+                self.in_flight -= 1
+                llm_slots().release()
+            ok = True
+            self.breaker.record_success()
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.breaker.record_failure()
+            raise asyncio.TimeoutError(f"LLM call for {purpose} exceeded {LLM_TIMEOUT_SECONDS}s") from None
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        finally:
+            self.breaker.release_trial()
+            record_llm_call(purpose, time.perf_counter() - started, text, "".join(parts), ok=ok)
+
+    def stats(self) -> dict:
+        return {"model": f"{self.provider}/{self.model}", "in_flight": self.in_flight, "timeouts": self.timeouts, **self.breaker.stats()}
+
+_llm_clients = {}
+
+def get_llm_client(session_id: str, system_message: str, provider: str = "openai", model: str = "gpt-4o") -> LlmClient:
+    """The shared client for this model and system prompt"""
+    key = (provider, model, system_message)
+    client = _llm_clients.get(key)
+    if client is None:
+        client = _llm_clients[key] = LlmClient(session_id, system_message, provider, model)
+    return client
+
+def llm_stats() -> dict:
+    return {
+        "max_concurrency": LLM_MAX_CONCURRENCY,
+        "timeout_seconds": LLM_TIMEOUT_SECONDS,
+        "clients": {c.session_id: c.stats() for c in _llm_clients.values()}
+    }
+
+CATEGORIZE_SYSTEM_MESSAGE = "You are an expense categorization assistant. Categorize expenses into one of these categories ONLY: Food, Transportation, Shopping, Entertainment, Bills, Healthcare, Education, Other. Return only the category name, nothing else."
+CATEGORIZE_BATCH_SYSTEM_MESSAGE = "You are an expense categorization assistant. Categorize expenses into one of these categories ONLY: Food, Transportation, Shopping, Entertainment, Bills, Healthcare, Education, Other. You will receive a numbered list of expenses. Return only a JSON array of category names, one per expense, in the same order, nothing else."
+FINANCIAL_ADVISOR_SYSTEM_MESSAGE = "You are a personal financial advisor. Analyze the user's spending patterns and provide 3-4 actionable, personalized savings tips. Be encouraging and specific. Format your response as a list of tips."
+
+async def request_llm_category(description: str, amount: float) -> str:
+    """Ask the LLM for a category; raises if the call fails"""
+    client = get_llm_client("expense_categorization", CATEGORIZE_SYSTEM_MESSAGE)
+    response = await client.send("categorize", f"Categorize this expense: '{description}' (Amount: ${amount})")
+    
+    category = response.strip()
+    if category in VALID_CATEGORIES:
+        return category
+    return "Other"
+
+async def request_llm_categories(items: list) -> list:
+    """Categorize several (description, amount) pairs in one LLM call; raises if the call fails"""
+    client = get_llm_client("expense_categorization_batch", CATEGORIZE_BATCH_SYSTEM_MESSAGE)
+    lines = [f"{i}. '{description}' (Amount: ${amount})" for i, (description, amount) in enumerate(items, 1)]
+    response = await client.send("categorize_batch", "Categorize these expenses:\n" + "\n".join(lines))
+    
+    text = response.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    categories = json.loads(text)
+    if not isinstance(categories, list) or len(categories) != len(items):
+        raise ValueError(f"Expected {len(items)} categories, got {text[:200]!r}")
+    return [c if c in VALID_CATEGORIES else "Other" for c in (str(c).strip() for c in categories)]
+
+class CategorizationBatcher:
+    """Collects categorization requests for a short window and sends them as one prompt.
+
+    Callers await submit(); the first request opens a window of CATEGORIZE_BATCH_WINDOW_MS
+    and the batch is flushed when the window closes or CATEGORIZE_BATCH_MAX_SIZE distinct
+    descriptions are waiting, whichever comes first.
+    """
+
+    def __init__(self, window_ms: float, max_size: int):
+        self.window = window_ms / 1000
+        self.max_size = max(1, max_size)
+        self._pending = {}
+        self._timer = None
+        # The event loop only holds weak references to tasks; keep in-flight batches alive
+        self._sending = set()
+        self.batches = 0
+        self.batched_items = 0
+        self.failed_batches = 0
+
+    async def submit(self, description: str, amount: float) -> str:
+        if self.window <= 0 or self.max_size == 1:
+            return await request_llm_category(description, amount)
+
+        key = normalize_description(description)
+        entry = self._pending.get(key)
+        if entry is None:
+            entry = (description, amount, asyncio.get_running_loop().create_future())
+            self._pending[key] = entry
+        future = entry[2]
+
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = list(self._pending.values()), {}
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, batch: list):
+        self.batches += 1
+        self.batched_items += len(batch)
+        try:
+            if len(batch) == 1:
+                categories = [await request_llm_category(batch[0][0], batch[0][1])]
+            else:
+                categories = await request_llm_categories([(d, a) for d, a, _ in batch])
+        except Exception as e:
+            self.failed_batches += 1
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), category in zip(batch, categories):
+            if not future.done():
+                future.set_result(category)
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_size,
+            "batches": self.batches,
+            "items": self.batched_items,
+            "avg_batch_size": (self.batched_items / self.batches) if self.batches else 0,
+            "failed_batches": self.failed_batches
+        }
+
+categorization_batcher = CategorizationBatcher(CATEGORIZE_BATCH_WINDOW_MS, CATEGORIZE_BATCH_MAX_SIZE)
+
+async def categorize_expense_locally(description: str, user_id: Optional[str] = None) -> Optional[str]:
+    """Categorize from the local classifier or the cache; None means only the LLM can decide"""
+    category = await local_categorizer.categorize(description, user_id)
+    if category:
+        return category
+    return await category_cache.get(normalize_description(description))
+
+async def request_expense_category(description: str, amount: float, user_id: Optional[str] = None) -> str:
+    """Categorize locally when possible, otherwise with the LLM; raises if the LLM call fails"""
+    category = await categorize_expense_locally(description, user_id)
+    if category:
+        return category
+    
+    category = await categorization_batcher.submit(description, amount)
+    await category_cache.set(normalize_description(description), category)
+    return category
+
+async def categorize_expense_with_ai(description: str, amount: float, user_id: Optional[str] = None) -> Optional[str]:
+    """Use AI to categorize expense based on description and amount.
+
+    None means the LLM call failed (timeout, open breaker, error); callers store "Other"
+    but must not teach the local classifier with it.
+    """
+    try:
+        return await request_expense_category(description, amount, user_id)
     except Exception as e:
         logging.error(f"AI categorization failed: {e}")
-        return "Other"
+        return None
 
-async def generate_financial_advice(user_id: str) -> str:
-    """Generate personalized financial advice based on user's spending patterns"""
-    try:
-        # Get last 30 days of expenses
-        expenses = await db.expenses.find({"user_id": user_id}).sort("created_at", -1).limit(100).to_list(100)
-        
-        if not expenses:
-            return "Start tracking your expenses to get personalized financial advice!"
-        
-        # Calculate spending by category
-        category_totals = {}
-        total_spent = 0
-        for exp in expenses:
-            cat = exp.get('category', 'Other')
-            amt = exp.get('amount', 0)
-            category_totals[cat] = category_totals.get(cat, 0) + amt
-            total_spent += amt
-        
-        # Get budgets
-        budgets = await db.budgets.find({"user_id": user_id}).to_list(100)
-        
-        # Prepare context for AI
-        context = f"""User's spending data:
+# ==================== Deferred Categorization ====================
+# Jobs live in the categorization_jobs collection so they survive restarts. A worker claims a
+# job by leasing it; if the worker dies the lease expires and another worker picks it up.
+
+async def enqueue_categorization_job(expense: "Expense"):
+    now = datetime.now(timezone.utc)
+    await db.categorization_jobs.insert_one({
+        "id": str(uuid.uuid4()),
+        "expense_id": expense.id,
+        "user_id": expense.user_id,
+        "description": expense.description,
+        "amount": expense.amount,
+        "date": expense.date,
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now
+    })
+    categorization_worker.ensure_running()
+
+async def claim_categorization_job() -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    job = await db.categorization_jobs.find_one_and_update(
+        {"available_at": {"$lte": now}},
+        {
+            "$set": {"available_at": now + timedelta(seconds=CATEGORIZATION_JOB_LEASE_SECONDS)},
+            "$inc": {"attempts": 1}
+        },
+        sort=[("available_at", 1)],
+        projection={"_id": 0}
+    )
+    if job:
+        job['attempts'] += 1
+    return job
+
+async def complete_categorization_job(job: dict, category: str, learn: bool = True):
+    """Store the job's final category; ``learn`` is False for the fallback after giving up"""
+    seq = await next_change_seq(job['user_id'])
+    result = await db.expenses.update_one(
+        {"id": job['expense_id'], "user_id": job['user_id'], "category_pending": True},
+        {"$set": {"category": category, "ai_categorized": True, "category_pending": False, "seq": seq}}
+    )
+    if result.modified_count:
+        # Move the amount out of the placeholder category. $inc commutes, so this stays
+        # correct even if the expense is deleted concurrently.
+        await apply_expense_to_rollups(job['user_id'], job['date'], PENDING_CATEGORY, job['amount'], count=-1)
+        await apply_expense_to_rollups(job['user_id'], job['date'], category, job['amount'])
+        await bump_data_version(job['user_id'])
+        if learn:
+            local_categorizer.observe(job['user_id'], job['description'], category)
+    await db.categorization_jobs.delete_one({"id": job['id']})
+
+class CategorizationWorker:
+    """In-process consumer of categorization_jobs"""
+
+    def __init__(self, concurrency: int):
+        self.concurrency = max(1, concurrency)
+        self._tasks = []
+        self._wakeup = None
+        self.processed = 0
+        self.retried = 0
+        self.abandoned = 0
+
+    def ensure_running(self):
+        if not CATEGORIZATION_WORKER_ENABLED:
+            return
+        self._tasks = [t for t in self._tasks if not t.done()]
+        if self._wakeup is None or not self._tasks:
+            self._wakeup = asyncio.Event()
+        while len(self._tasks) < self.concurrency:
+            self._tasks.append(asyncio.ensure_future(self.run()))
+        self._wakeup.set()
+
+    async def run(self, drain: bool = False):
+        """Process jobs until cancelled, or until the queue is empty when drain is set"""
+        # Usually started from inside a request, whose context the task copied; without this
+        # the worker's database calls would land in that request's timings for good
+        request_timings.set(None)
+        while True:
+            try:
+                job = await claim_categorization_job()
+            except Exception as e:
+                logging.error(f"Claiming categorization job failed: {e}")
+                job = None
+            if job is None:
+                if drain:
+                    return
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), CATEGORIZATION_WORKER_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.process(job)
+
+    async def process(self, job: dict):
+        if job['attempts'] > CATEGORIZATION_JOB_MAX_ATTEMPTS:
+            # A worker died while holding this job too many times; give up on the LLM
+            self.abandoned += 1
+            await complete_categorization_job(job, "Other", learn=False)
+            return
+        try:
+            # Failures must reach the retry logic below rather than becoming "Other"
+            category = await request_expense_category(job['description'], job['amount'], job['user_id'])
+            await complete_categorization_job(job, category)
+            self.processed += 1
+        except Exception as e:
+            logging.error(f"Deferred categorization of expense {job['expense_id']} failed: {e}")
+            if job['attempts'] >= CATEGORIZATION_JOB_MAX_ATTEMPTS:
+                self.abandoned += 1
+                await complete_categorization_job(job, "Other", learn=False)
+            else:
+                self.retried += 1
+                await db.categorization_jobs.update_one(
+                    {"id": job['id']},
+                    {"$set": {"available_at": datetime.now(timezone.utc) + timedelta(seconds=2 ** job['attempts'])}}
+                )
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "enabled": CATEGORIZATION_WORKER_ENABLED,
+            "running_tasks": len([t for t in self._tasks if not t.done()]),
+            "processed": self.processed,
+            "retried": self.retried,
+            "abandoned": self.abandoned
+        }
+
+categorization_worker = CategorizationWorker(CATEGORIZATION_WORKER_CONCURRENCY)
+
+async def record_manual_category(description: str, category: str):
+    """Drop a cached AI categorization that a user has corrected on an existing expense.
+
+    Only recategorizations call this: a category chosen when creating an expense says
+    nothing about whether the cached AI answer was wrong.
+    """
+    await category_cache.invalidate(normalize_description(description), unless_category=category)
+
+NO_EXPENSES_ADVICE = "Start tracking your expenses to get personalized financial advice!"
+ADVICE_UNAVAILABLE = "Unable to generate advice at this time. Please try again later."
+
+async def build_advice_context(user_id: str) -> Optional[str]:
+    """Summarize recent spending and budgets for the advisor; None when there is nothing to summarize.
+
+    The text is built deterministically so it can double as the cache fingerprint source.
+    """
+    # Summarize the most recent months of spending from the rollups
+    rollups = await get_user_rollups(user_id)
+    
+    if not rollups:
+        return None
+    
+    recent_months = sorted({r['month'] for r in rollups})[-ADVICE_MONTHS:]
+    category_totals = {}
+    total_spent = 0
+    transaction_count = 0
+    for r in sorted(rollups, key=lambda r: (r['month'], r['category'])):
+        if r['month'] not in recent_months:
+            continue
+        category_totals[r['category']] = round(category_totals.get(r['category'], 0) + r['total'], 2)
+        total_spent += r['total']
+        transaction_count += r['count']
+    
+    # Get budgets
+    budgets = await db.budgets.find({"user_id": user_id}, {"_id": 0, "category": 1, "limit": 1}).sort(
+        [("year", 1), ("month", 1), ("category", 1)]
+    ).to_list(100)
+    
+    # Prepare context for AI
+    return f"""User's spending data:
 - Total spent: ${total_spent:.2f}
-- Number of transactions: {len(expenses)}
-- Spending by category: {json.dumps(category_totals, indent=2)}
+- Number of transactions: {transaction_count}
+- Spending by category: {json.dumps(category_totals, indent=2, sort_keys=True)}
 - Budgets: {json.dumps([{'category': b['category'], 'limit': b['limit']} for b in budgets], indent=2)}
 """
-        
-        llm_key = os.environ.get('EMERGENT_LLM_KEY')
-        chat = LlmChat(
-            api_key=llm_key,
-            session_id=f"financial_advisor_{user_id}",
-            system_message="You are a personal financial advisor. Analyze the user's spending patterns and provide 3-4 actionable, personalized savings tips. Be encouraging and specific. Format your response as a list of tips."
-        ).with_model("openai", "gpt-4o")
-        
-        message = UserMessage(text=context)
-        response = await chat.send_message(message)
-        
-        return response
+
+def advice_fingerprint(context: str) -> str:
+    return hashlib.sha256(context.encode()).hexdigest()
+
+def financial_advisor_client() -> LlmClient:
+    return get_llm_client("financial_advisor", FINANCIAL_ADVISOR_SYSTEM_MESSAGE)
+
+async def generate_financial_advice(user_id: str, context: str, fingerprint: str) -> str:
+    """Generate personalized financial advice based on user's spending patterns and store it as an insight"""
+    advice = await financial_advisor_client().send("financial_advice", context)
+    
+    await save_advice_insight(user_id, advice, fingerprint)
+    return advice
+
+async def save_advice_insight(user_id: str, advice: str, fingerprint: str):
+    insight = AIInsight(
+        user_id=user_id,
+        insight_type="financial_advice",
+        content=advice
+    )
+    
+    insight_doc = insight.model_dump()
+    insight_doc['fingerprint'] = fingerprint
+    
+    await db.ai_insights.insert_one(insight_doc)
+
+async def find_cached_advice(user_id: str, fingerprint: str) -> Optional[str]:
+    """Advice already generated for exactly this spending summary, if any"""
+    insight = await db.ai_insights.find_one(
+        {"user_id": user_id, "insight_type": "financial_advice", "fingerprint": fingerprint},
+        {"_id": 0, "content": 1},
+        sort=[("generated_at", -1)]
+    )
+    return insight['content'] if insight else None
+
+async def find_latest_advice(user_id: str) -> Optional[str]:
+    """Most recent advice for the user, served when fresh advice cannot be generated"""
+    insight = await db.ai_insights.find_one(
+        {"user_id": user_id, "insight_type": "financial_advice"},
+        {"_id": 0, "content": 1},
+        sort=[("generated_at", -1)]
+    )
+    return insight['content'] if insight else None
+
+class GenerationAbandoned(Exception):
+    """The leading caller went away before its generation finished; waiters should retry"""
+
+class PerUserSingleFlight:
+    """Allows at most one advice generation in flight per user.
+
+    Callers with the same fingerprint share the running generation; a caller whose data
+    has changed waits for the running one to finish before starting its own.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.started = 0
+        self.deduplicated = 0
+
+    async def join_or_lead(self, user_id: str, fingerprint: str):
+        """Return (None, result) when an identical generation just finished elsewhere, or
+        (future, None) when the caller must generate and resolve future itself."""
+        while True:
+            current = self._inflight.get(user_id)
+            if current is None or current[1].done():
+                break
+            running_fingerprint, future = current
+            if running_fingerprint == fingerprint:
+                try:
+                    result = await asyncio.shield(future)
+                except GenerationAbandoned:
+                    # The leader was cancelled; take over (or join whoever did)
+                    continue
+                self.deduplicated += 1
+                return None, result
+            await asyncio.wait([future])
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark failures as retrieved so an unshared failure is not logged as unhandled
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        future.add_done_callback(lambda f: self._release(user_id, f))
+        self._inflight[user_id] = (fingerprint, future)
+        self.started += 1
+        return future, None
+
+    def _release(self, user_id: str, future):
+        # A finished entry may already have been replaced by a newer leader
+        current = self._inflight.get(user_id)
+        if current is not None and current[1] is future:
+            del self._inflight[user_id]
+
+    async def run(self, user_id: str, fingerprint: str, fn):
+        future, result = await self.join_or_lead(user_id, fingerprint)
+        if future is None:
+            return result
+        try:
+            result = await fn()
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            # Cancelled (or interrupted): never hand our cancellation to other requests
+            if not future.done():
+                future.set_exception(GenerationAbandoned())
+
+    def stats(self) -> dict:
+        return {"in_flight": len(self._inflight), "started": self.started, "deduplicated": self.deduplicated}
+
+advice_single_flight = PerUserSingleFlight()
+
+class StreamLatencyStats:
+    """Time-to-first-token of streamed advice, measured from the start of the request"""
+
+    def __init__(self):
+        self.streams = 0
+        self.total_ttfb_ms = 0.0
+        self.max_ttfb_ms = 0.0
+        self.last_ttfb_ms = None
+
+    def record(self, ttfb_ms: float):
+        self.streams += 1
+        self.total_ttfb_ms += ttfb_ms
+        self.max_ttfb_ms = max(self.max_ttfb_ms, ttfb_ms)
+        self.last_ttfb_ms = ttfb_ms
+
+    def stats(self) -> dict:
+        return {
+            "streams": self.streams,
+            "avg_ttfb_ms": (self.total_ttfb_ms / self.streams) if self.streams else 0,
+            "max_ttfb_ms": self.max_ttfb_ms,
+            "last_ttfb_ms": self.last_ttfb_ms
+        }
+
+advice_stream_stats = StreamLatencyStats()
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_financial_advice(user_id: str):
+    """Yield SSE events: "token" for each piece of advice text, then "done" (or "error")"""
+    started = time.perf_counter()
+    first_token_at = None
+
+    def token(text: str) -> str:
+        nonlocal first_token_at
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+            advice_stream_stats.record((first_token_at - started) * 1000)
+        return sse_event("token", {"text": text})
+
+    def done(advice: str, cached: bool) -> str:
+        ttfb_ms = (first_token_at - started) * 1000 if first_token_at else None
+        return sse_event("done", {"advice": advice, "cached": cached, "ttfb_ms": ttfb_ms})
+
+    context = await build_advice_context(user_id)
+    if context is None:
+        yield token(NO_EXPENSES_ADVICE)
+        yield done(NO_EXPENSES_ADVICE, False)
+        return
+
+    fingerprint = advice_fingerprint(context)
+    cached = await find_cached_advice(user_id, fingerprint)
+    if cached:
+        yield token(cached)
+        yield done(cached, True)
+        return
+
+    future, shared = await advice_single_flight.join_or_lead(user_id, fingerprint)
+    if future is None:
+        # An identical generation finished while we waited; replay it
+        yield token(shared)
+        yield done(shared, True)
+        return
+
+    parts = []
+    try:
+        async for text in financial_advisor_client().stream("financial_advice_stream", context):
+            parts.append(text)
+            yield token(text)
+        advice = "".join(parts)
+        await save_advice_insight(user_id, advice, fingerprint)
+        future.set_result(advice)
+        if first_token_at:
+            logging.info(
+                f"Streamed financial advice for {user_id}: ttfb={(first_token_at - started) * 1000:.0f}ms "
+                f"total={(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+        yield done(advice, False)
+    except Exception as e:
+        logging.error(f"Financial advice streaming failed: {e}")
+        future.set_exception(e)
+        # Nothing sent yet: fall back to the last stored advice if there is any
+        latest = None if parts else await find_latest_advice(user_id)
+        if latest:
+            yield token(latest)
+            yield done(latest, True)
+        else:
+            yield sse_event("error", {"detail": ADVICE_UNAVAILABLE})
+    finally:
+        # Client went away mid-stream: let anyone waiting on this generation retry it
+        if not future.done():
+            future.set_exception(GenerationAbandoned())
+
+async def get_or_generate_advice(user_id: str) -> dict:
+    """Return {"advice", "cached"}, reusing stored advice while the user's data is unchanged"""
+    context = await build_advice_context(user_id)
+    if context is None:
+        return {"advice": NO_EXPENSES_ADVICE, "cached": False}
+    
+    fingerprint = advice_fingerprint(context)
+    cached = await find_cached_advice(user_id, fingerprint)
+    if cached:
+        return {"advice": cached, "cached": True}
+    
+    try:
+        advice = await advice_single_flight.run(
+            user_id, fingerprint, lambda: generate_financial_advice(user_id, context, fingerprint)
+        )
+        return {"advice": advice, "cached": False}
     except Exception as e:
         logging.error(f"Financial advice generation failed: {e}")
-        return "Unable to generate advice at this time. Please try again later."
+        latest = await find_latest_advice(user_id)
+        if latest:
+            return {"advice": latest, "cached": True}
+        return {"advice": ADVICE_UNAVAILABLE, "cached": False}
 
 # ==================== Auth Routes ====================
 
 @api_router.post("/auth/register")
 async def register(user_data: UserRegister):
+    from pymongo.errors import DuplicateKeyError
     # Check if user exists
     existing = await db.users.find_one({"email": user_data.email})
     if existing:
@@ -233,10 +2033,15 @@ async def register(user_data: UserRegister):
     )
     
     user_doc = user.model_dump()
-    user_doc['password_hash'] = hash_password(user_data.password)
-    user_doc['created_at'] = user_doc['created_at'].isoformat()
+    user_doc['password_hash'] = await hash_password_async(user_data.password)
+    # A new user has no expenses, so their (empty) rollups are already complete
+    user_doc['rollups_built'] = True
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # A concurrent registration for the same email won the email_unique index
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     token = create_token(user.id)
     return {"token": token, "user": {"id": user.id, "email": user.email, "name": user.name}}
@@ -244,9 +2049,17 @@ async def register(user_data: UserRegister):
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
     user_doc = await db.users.find_one({"email": credentials.email})
-    if not user_doc or not verify_password(credentials.password, user_doc['password_hash']):
+    if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
+    valid, new_hash = await verify_password_async(credentials.password, user_doc['password_hash'])
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    
+    # Transparently upgrade hashes created with a different bcrypt cost
+    if new_hash:
+        await db.users.update_one({"id": user_doc['id']}, {"$set": {"password_hash": new_hash}})
+    
     token = create_token(user_doc['id'])
     return {"token": token, "user": {"id": user_doc['id'], "email": user_doc['email'], "name": user_doc['name']}}
 
@@ -264,14 +2077,37 @@ async def get_me(user_id: str = Depends(get_current_user)):
 # ==================== Expense Routes ====================
 
 @api_router.post("/expenses", response_model=Expense)
-async def create_expense(expense_data: ExpenseCreate, user_id: str = Depends(get_current_user)):
+async def create_expense(
+    expense_data: ExpenseCreate,
+    defer: bool = DEFERRED_CATEGORIZATION,
+    user_id: str = Depends(get_current_user)
+):
+    """Create an expense, categorizing it with AI when no category is given.
+
+    With ``defer`` the expense is stored right away under a placeholder category with
+    ``category_pending`` set whenever the LLM would be needed; poll
+    ``GET /api/expenses/{id}?wait=`` to pick up the final category.
+    """
     # Auto-categorize if no category provided
     category = expense_data.category
     ai_categorized = False
+    category_pending = False
     
     if not category:
-        category = await categorize_expense_with_ai(expense_data.description, expense_data.amount)
         ai_categorized = True
+        if defer:
+            category = await categorize_expense_locally(expense_data.description, user_id)
+            if not category:
+                category = PENDING_CATEGORY
+                ai_categorized = False
+                category_pending = True
+        else:
+            category = await categorize_expense_with_ai(expense_data.description, expense_data.amount, user_id)
+    if category is None:
+        # The LLM failed: store the fallback without teaching it to the local classifier
+        category = "Other"
+    elif not category_pending:
+        local_categorizer.observe(user_id, expense_data.description, category)
     
     expense = Expense(
         user_id=user_id,
@@ -279,155 +2115,991 @@ async def create_expense(expense_data: ExpenseCreate, user_id: str = Depends(get
         category=category,
         description=expense_data.description,
         date=expense_data.date,
-        ai_categorized=ai_categorized
+        ai_categorized=ai_categorized,
+        category_pending=category_pending
     )
     
-    expense_doc = expense.model_dump()
-    expense_doc['created_at'] = expense_doc['created_at'].isoformat()
-    
-    await db.expenses.insert_one(expense_doc)
+    await db.expenses.insert_one({**expense_to_doc(expense), "seq": await next_change_seq(user_id)})
+    await apply_expense_to_rollups(user_id, expense.date, expense.category, expense.amount)
+    await bump_data_version(user_id)
+    if category_pending:
+        await enqueue_categorization_job(expense)
     return expense
 
 @api_router.get("/expenses", response_model=List[Expense])
-async def get_expenses(user_id: str = Depends(get_current_user)):
-    expenses = await db.expenses.find({"user_id": user_id}, {"_id": 0}).sort("date", -1).to_list(1000)
+async def get_expenses(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=EXPENSE_PAGE_MAX_LIMIT),
+    after: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    category: Optional[str] = None,
+    min_amount: Optional[float] = Query(None, ge=0),
+    max_amount: Optional[float] = Query(None, ge=0),
+    fields: Optional[str] = None,
+    user_id: str = Depends(get_current_user)
+):
+    """List expenses newest first.
+
+    Without ``limit`` the full history is returned. With ``limit`` a page is returned and,
+    if more rows exist, the cursor for the next page is sent in the ``X-Next-Cursor`` header.
+    ``format=ndjson`` streams one expense per line straight from the database cursor.
+    ``from``/``to`` (inclusive YYYY-MM-DD), ``category`` and ``min_amount``/``max_amount``
+    filter on the server; ``fields`` is a comma-separated list of fields to return.
+    Responses carry an ETag; a matching ``If-None-Match`` gets 304 without a query.
+    """
+    not_modified = await check_not_modified(request, response, user_id)
+    if not_modified:
+        return not_modified
+    query = with_clauses(
+        expense_page_query(user_id, after),
+        expense_filter_clauses(date_from, date_to, category, min_amount, max_amount)
+    )
+    projection, selected = expense_fields_projection(fields) if fields else (EXPENSE_PROJECTION, None)
+
+    if format == "ndjson":
+        return carry_headers(await stream_expenses_ndjson(query, limit, projection, selected), response)
+
+    cursor = db.expenses.find(query, projection).sort(EXPENSE_SORT)
+    if limit:
+        expenses = await cursor.limit(limit + 1).to_list(limit + 1)
+        if len(expenses) > limit:
+            expenses = expenses[:limit]
+            response.headers["X-Next-Cursor"] = encode_expense_cursor(expenses[-1])
+    else:
+        expenses = await cursor.to_list(None)
     
-    for exp in expenses:
-        if isinstance(exp.get('created_at'), str):
-            exp['created_at'] = datetime.fromisoformat(exp['created_at'])
+    if selected:
+        # Partial rows do not fit response_model, so they are encoded directly
+        return carry_headers(FastJSONResponse([select_fields(expense_from_doc(exp), selected) for exp in expenses]), response)
+    if FAST_JSON_RESPONSES:
+        return carry_headers(FastJSONResponse([{**EXPENSE_DEFAULTS, **expense_from_doc(exp)} for exp in expenses]), response)
+    return [expense_from_doc(exp) for exp in expenses]
+
+def select_fields(expense: dict, selected: list) -> dict:
+    return {name: expense.get(name, EXPENSE_DEFAULTS.get(name)) for name in selected}
+
+async def stream_expenses_ndjson(query: dict, limit: Optional[int], projection: dict = EXPENSE_PROJECTION, selected: Optional[list] = None) -> StreamingResponse:
+    headers = {}
+    if limit:
+        # Probe for the first row of the next page so the cursor can go in the headers
+        # before the body starts streaming.
+        probe = await db.expenses.find(query, {"_id": 0, "date": 1, "id": 1}).sort(EXPENSE_SORT).skip(limit - 1).limit(2).to_list(2)
+        if len(probe) == 2:
+            headers["X-Next-Cursor"] = encode_expense_cursor(probe[0])
+
+    async def rows():
+        cursor = db.expenses.find(query, projection).sort(EXPENSE_SORT).batch_size(EXPENSE_STREAM_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+        async for exp in cursor:
+            exp = expense_from_doc(exp)
+            row = select_fields(exp, selected) if selected else {**EXPENSE_DEFAULTS, **exp}
+            yield dumps_json(row) + b"\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson", headers=headers)
+
+def format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" if err['loc'] else err['msg']
+        for err in error.errors()
+    )
+
+async def iter_body_lines(request: Request):
+    """Yield decoded lines from the request body as it streams in"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    async for chunk in request.stream():
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    if buffer.strip():
+        yield buffer.rstrip("\r")
+
+def parse_csv_record(lines: list):
+    """Parse one CSV record from lines (each ending in a newline).
+
+    Returns None while a quoted field is still open at the last line, i.e. the csv reader
+    asked for a line beyond the ones given. Quote characters inside unquoted fields, such
+    as an inch mark, are left to the csv module rather than counted.
+    """
+    exhausted = False
+
+    def source():
+        nonlocal exhausted
+        yield from lines
+        exhausted = True
+
+    values = next(csv.reader(source()), [])
+    return None if exhausted else values
+
+async def iter_import_rows(request: Request, fmt: str):
+    """Yield (row_number, dict or error string) for each CSV record or JSON line"""
+    row_number = 0
+    if fmt == "ndjson":
+        async for line in iter_body_lines(request):
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                row = json.loads(line)
+                yield row_number, row if isinstance(row, dict) else "Row must be a JSON object"
+            except json.JSONDecodeError as e:
+                yield row_number, f"Invalid JSON: {e.msg}"
+        return
+
+    header = None
+    pending = []
+    async for line in iter_body_lines(request):
+        if not pending and not line.strip():
+            continue
+        # A quoted field may contain newlines; keep reading until the record is complete
+        pending.append(line + "\n")
+        values = parse_csv_record(pending)
+        if values is None:
+            continue
+        pending = []
+        if header is None:
+            header = [h.strip().lower() for h in values]
+            continue
+        row_number += 1
+        if len(values) != len(header):
+            yield row_number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row_number, dict(zip(header, values))
+    if pending:
+        yield row_number + 1, "Unterminated quoted field"
+
+async def categorize_expenses_batch(user_id: str, pending: list) -> set:
+    """Fill in category for rows without one, calling the categorizer once per distinct description.
+
+    Returns the ids of expenses that fell back to "Other" because the LLM call failed.
+    """
+    by_description = {}
+    for expense in pending:
+        by_description.setdefault(normalize_description(expense.description), []).append(expense)
+
+    semaphore = asyncio.Semaphore(BULK_CATEGORIZE_CONCURRENCY)
+    fallback = set()
+
+    async def categorize(group: list):
+        async with semaphore:
+            category = await categorize_expense_with_ai(group[0].description, group[0].amount, user_id)
+        if category is None:
+            category = "Other"
+            fallback.update(expense.id for expense in group)
+        for expense in group:
+            expense.category = category
+            expense.ai_categorized = True
+
+    await asyncio.gather(*(categorize(group) for group in by_description.values()))
+    return fallback
+
+async def import_expense_chunk(user_id: str, chunk: list) -> int:
+    """Categorize, insert and roll up one chunk of validated rows; returns rows AI-categorized"""
+    expenses = [
+        Expense(
+            user_id=user_id,
+            amount=data.amount,
+            category=data.category or "",
+            description=data.description,
+            date=data.date
+        )
+        for data in chunk
+    ]
+    uncategorized = [e for e in expenses if not e.category]
+    fallback = await categorize_expenses_batch(user_id, uncategorized)
+
+    for expense in expenses:
+        if expense.id not in fallback:
+            local_categorizer.observe(user_id, expense.description, expense.category)
+
+    seq = await next_change_seq(user_id)
+    await db.expenses.insert_many([{**expense_to_doc(e), "seq": seq} for e in expenses], ordered=False)
+    await apply_expenses_to_rollups(user_id, [e.model_dump() for e in expenses])
+    await bump_data_version(user_id)
+    return len(uncategorized)
+
+@api_router.post("/expenses/bulk")
+async def bulk_import_expenses(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    user_id: str = Depends(get_current_user)
+):
+    """Import many expenses from a streamed CSV (with header row) or JSON-lines body.
+
+    Rows are validated with ExpenseCreate; invalid rows are reported and skipped while
+    valid ones are inserted in chunks of BULK_IMPORT_CHUNK_SIZE.
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    started = time.perf_counter()
+    inserted = 0
+    ai_categorized = 0
+    errors = []
+    chunk = []
+
+    async for row_number, row in iter_import_rows(request, fmt):
+        if row_number > BULK_IMPORT_MAX_ROWS:
+            errors.append({"row": row_number, "error": f"Import is limited to {BULK_IMPORT_MAX_ROWS} rows"})
+            break
+        if isinstance(row, str):
+            errors.append({"row": row_number, "error": row})
+            continue
+        if not row.get("category"):
+            row["category"] = None
+        try:
+            chunk.append(ExpenseCreate(**row))
+        except ValidationError as e:
+            errors.append({"row": row_number, "error": format_validation_error(e)})
+            continue
+        if len(chunk) >= BULK_IMPORT_CHUNK_SIZE:
+            ai_categorized += await import_expense_chunk(user_id, chunk)
+            inserted += len(chunk)
+            chunk = []
+
+    if chunk:
+        ai_categorized += await import_expense_chunk(user_id, chunk)
+        inserted += len(chunk)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "inserted": inserted,
+        "failed": len(errors),
+        "ai_categorized": ai_categorized,
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round((inserted + len(errors)) / elapsed, 1) if elapsed > 0 else None
+    }
+
+def expense_search_query(user_id: str, q: str) -> dict:
+    # The text index is prefixed by user_id, so the equality match on it is required
+    return {"user_id": user_id, "$text": {"$search": q}}
+
+EXPENSE_SEARCH_SORT = [("score", {"$meta": "textScore"}), *EXPENSE_SORT]
+
+@api_router.get("/expenses/search", response_model=List[ExpenseSearchResult])
+async def search_expenses(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(50, ge=1, le=EXPENSE_SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0, le=EXPENSE_SEARCH_MAX_OFFSET),
+    user_id: str = Depends(get_current_user)
+):
+    """Full-text search over expense descriptions, best match first.
+
+    Words are matched after stemming and case folding, so "uber rides" finds "Uber ride home".
+    Ties are broken newest first. When more results exist the offset of the next page is
+    sent in the ``X-Next-Offset`` header.
+    """
+    projection = {**EXPENSE_PROJECTION, "score": {"$meta": "textScore"}}
+    expenses = await db.expenses.find(expense_search_query(user_id, q), projection) \
+        .sort(EXPENSE_SEARCH_SORT).skip(offset).limit(limit + 1).to_list(limit + 1)
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        response.headers["X-Next-Offset"] = str(offset + limit)
+
+    if FAST_JSON_RESPONSES:
+        return carry_headers(FastJSONResponse([{**EXPENSE_DEFAULTS, **expense_from_doc(exp)} for exp in expenses]), response)
+    return [expense_from_doc(exp) for exp in expenses]
+
+@api_router.post("/expenses/batch")
+async def batch_update_expenses(batch: ExpenseBatch, user_id: str = Depends(get_current_user)):
+    """Delete and recategorize many expenses in one bulk_write.
+
+    Every item gets an outcome: ``deleted``, ``updated``, ``not_found``, ``duplicate`` for an
+    id that appears more than once in the batch, or ``conflict`` when another request changed
+    the expense first and it was left alone. Rollups, the sync sequence and the data version
+    are updated once for the whole batch.
+    """
+    from pymongo import DeleteOne, UpdateOne
+    if len(batch.delete) + len(batch.recategorize) > EXPENSE_BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A batch is limited to {EXPENSE_BATCH_MAX_ITEMS} items")
+
+    items, seen = [], set()
+    for op, expense_id, category in [("delete", i, None) for i in batch.delete] + \
+            [("recategorize", u.id, u.category) for u in batch.recategorize]:
+        items.append({"id": expense_id, "op": op, "category": category, "status": "duplicate" if expense_id in seen else None})
+        seen.add(expense_id)
+
+    current = {
+        doc["id"]: expense_from_doc(doc)
+        for doc in await db.expenses.find(
+            {"user_id": user_id, "id": {"$in": list(seen)}},
+            {"_id": 0, "id": 1, "date": 1, "category": 1, "amount": 1, "amount_cents": 1, "description": 1}
+        ).to_list(None)
+    }
+    for item in items:
+        if item["status"] is None and item["id"] not in current:
+            item["status"] = "not_found"
+    todo = [item for item in items if item["status"] is None]
+
+    seq = await next_change_seq(user_id)
+    operations, added, removed = [], [], []
+    for item in todo:
+        exp = current[item["id"]]
+        # Each write is pinned to the state read above so the rollup change below stays exact
+        if item["op"] == "delete":
+            operations.append(DeleteOne({"id": item["id"], "user_id": user_id, "category": exp["category"]}))
+            removed.append(exp)
+        else:
+            operations.append(UpdateOne(
+                {"id": item["id"], "user_id": user_id, "category": exp["category"]},
+                {"$set": {"category": item["category"], "ai_categorized": False, "category_pending": False, "seq": seq}}
+            ))
+            removed.append(exp)
+            added.append({**exp, "category": item["category"]})
+
+    for item in todo:
+        item["status"] = "deleted" if item["op"] == "delete" else "updated"
+    if operations:
+        result = await db.expenses.bulk_write(operations, ordered=False)
+        deletes = sum(1 for item in todo if item["op"] == "delete")
+        if result.deleted_count == deletes and result.matched_count == len(todo) - deletes:
+            await apply_expenses_to_rollups(user_id, added, removed=removed)
+        else:
+            # Another request changed some of these expenses in between. bulk_write does not
+            # say which, so re-read them for the outcomes and recompute this user's rollups.
+            # The writes are already applied, so a failed rebuild is logged rather than
+            # failing the request.
+            after = {
+                doc["id"]: doc["category"]
+                for doc in await db.expenses.find(
+                    {"user_id": user_id, "id": {"$in": [item["id"] for item in todo]}}, {"_id": 0, "id": 1, "category": 1}
+                ).to_list(None)
+            }
+            for item in todo:
+                if item["op"] == "delete":
+                    applied = item["id"] not in after
+                else:
+                    applied = after.get(item["id"]) == item["category"]
+                if not applied:
+                    item["status"] = "conflict"
+            logging.warning(f"Expense batch for user {user_id} raced a concurrent write; rebuilding rollups")
+            try:
+                await rebuild_rollups(user_id)
+            except Exception as e:
+                logging.error(f"Rebuilding rollups for user {user_id} failed, run manage.py rollups rebuild: {e}")
+                await db.users.update_one({"id": user_id}, {"$unset": {"rollups_built": ""}})
+        await record_tombstones(user_id, "expenses", [item["id"] for item in todo if item["status"] == "deleted"], seq)
+        await bump_data_version(user_id)
+
+    recategorized = {(current[item["id"]]["description"], item["category"]) for item in todo if item["status"] == "updated"}
+    for description, category in recategorized:
+        local_categorizer.observe(user_id, description, category)
+        await record_manual_category(description, category)
+
+    return {
+        "deleted": sum(1 for item in items if item["status"] == "deleted"),
+        "updated": sum(1 for item in items if item["status"] == "updated"),
+        "results": [{"id": item["id"], "op": item["op"], "status": item["status"]} for item in items]
+    }
+
+@api_router.get("/expenses/{expense_id}", response_model=Expense)
+async def get_expense(
+    expense_id: str,
+    wait: float = Query(0, ge=0, le=EXPENSE_POLL_MAX_WAIT_SECONDS),
+    user_id: str = Depends(get_current_user)
+):
+    """Fetch one expense; with ``wait`` long-poll up to that many seconds for a pending category"""
+    deadline = time.monotonic() + wait
+    while True:
+        expense = await db.expenses.find_one({"id": expense_id, "user_id": user_id}, {"_id": 0})
+        if not expense:
+            raise HTTPException(status_code=404, detail="Expense not found")
+        if not expense.get('category_pending') or time.monotonic() >= deadline:
+            break
+        await asyncio.sleep(min(0.5, max(0, deadline - time.monotonic())))
     
-    return expenses
+    return expense_from_doc(expense)
 
 @api_router.delete("/expenses/{expense_id}")
 async def delete_expense(expense_id: str, user_id: str = Depends(get_current_user)):
-    result = await db.expenses.delete_one({"id": expense_id, "user_id": user_id})
-    if result.deleted_count == 0:
+    seq = await next_change_seq(user_id)
+    deleted = await db.expenses.find_one_and_delete(
+        {"id": expense_id, "user_id": user_id},
+        {"_id": 0, "date": 1, "category": 1, "amount": 1, "amount_cents": 1}
+    )
+    if not deleted:
         raise HTTPException(status_code=404, detail="Expense not found")
+    await record_tombstones(user_id, "expenses", [expense_id], seq)
+    deleted = expense_from_doc(deleted)
+    await apply_expense_to_rollups(user_id, deleted['date'], deleted['category'], deleted['amount'], count=-1)
+    await bump_data_version(user_id)
     return {"message": "Expense deleted successfully"}
 
 # ==================== Budget Routes ====================
 
+def budget_upsert(user_id: str, category: str, month: int, year: int, limit: float, seq: int) -> tuple:
+    """Filter and update that set a budget's limit, creating the budget if it does not exist"""
+    return (
+        {"user_id": user_id, "category": category, "month": month, "year": year},
+        {
+            "$set": {"limit": limit, "seq": seq},
+            "$setOnInsert": {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc)}
+        }
+    )
+
 @api_router.post("/budgets", response_model=Budget)
 async def create_budget(budget_data: BudgetCreate, user_id: str = Depends(get_current_user)):
-    # Check if budget already exists for this category/month/year
-    existing = await db.budgets.find_one({
-        "user_id": user_id,
-        "category": budget_data.category,
-        "month": budget_data.month,
-        "year": budget_data.year
-    })
-    
-    if existing:
-        # Update existing budget
-        await db.budgets.update_one(
-            {"id": existing['id']},
-            {"$set": {"limit": budget_data.limit}}
+    from pymongo import ReturnDocument
+    from pymongo.errors import DuplicateKeyError
+    # One atomic upsert keyed by the unique (user, category, month, year) index
+    seq = await next_change_seq(user_id)
+    query, update = budget_upsert(user_id, budget_data.category, budget_data.month, budget_data.year, budget_data.limit, seq)
+    try:
+        budget = await db.budgets.find_one_and_update(
+            query, update, projection={"_id": 0}, upsert=True, return_document=ReturnDocument.AFTER
         )
-        existing['limit'] = budget_data.limit
-        if isinstance(existing.get('created_at'), str):
-            existing['created_at'] = datetime.fromisoformat(existing['created_at'])
-        return existing
-    
-    budget = Budget(
-        user_id=user_id,
-        category=budget_data.category,
-        limit=budget_data.limit,
-        month=budget_data.month,
-        year=budget_data.year
-    )
-    
-    budget_doc = budget.model_dump()
-    budget_doc['created_at'] = budget_doc['created_at'].isoformat()
+    except DuplicateKeyError:
+        # A concurrent request inserted the same budget first; it now exists, so just update it
+        budget = await db.budgets.find_one_and_update(
+            query, {"$set": update["$set"]}, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+    await bump_data_version(user_id)
     
-    await db.budgets.insert_one(budget_doc)
+    if isinstance(budget.get('created_at'), str):
+        budget['created_at'] = datetime.fromisoformat(budget['created_at'])
     return budget
 
-@api_router.get("/budgets", response_model=List[Budget])
-async def get_budgets(user_id: str = Depends(get_current_user)):
-    budgets = await db.budgets.find({"user_id": user_id}, {"_id": 0}).to_list(100)
+@api_router.put("/budgets", response_model=List[Budget])
+async def set_month_budgets(update: BudgetMonthUpdate, user_id: str = Depends(get_current_user)):
+    """Set every budget for one month in a single bulk_write and return that month's budgets"""
+    from pymongo import DeleteMany, UpdateOne
+    categories = [b.category for b in update.budgets]
+    if len(set(categories)) != len(categories):
+        raise HTTPException(status_code=400, detail="Each category may only appear once")
     
+    seq = await next_change_seq(user_id)
+    operations = [
+        UpdateOne(*budget_upsert(user_id, b.category, update.month, update.year, b.limit, seq), upsert=True)
+        for b in update.budgets
+    ]
+    if update.replace:
+        removed = {"user_id": user_id, "month": update.month, "year": update.year, "category": {"$nin": categories}}
+        removed_ids = [b["id"] for b in await db.budgets.find(removed, {"_id": 0, "id": 1}).to_list(None)]
+        if removed_ids:
+            await record_tombstones(user_id, "budgets", removed_ids, seq)
+            operations.append(DeleteMany({**removed, "id": {"$in": removed_ids}}))
+    if operations:
+        await db.budgets.bulk_write(operations, ordered=False)
+        await bump_data_version(user_id)
+    
+    budgets = await db.budgets.find(
+        {"user_id": user_id, "month": update.month, "year": update.year}, {"_id": 0}
+    ).to_list(None)
     for budget in budgets:
         if isinstance(budget.get('created_at'), str):
             budget['created_at'] = datetime.fromisoformat(budget['created_at'])
-    
     return budgets
 
-# ==================== Dashboard & Analytics ====================
+def budget_status_pipeline(user_id: str, month: int, year: int) -> list:
+    """Join one month's budgets with that month's spending rollups"""
+    return [
+        {"$match": {"user_id": user_id, "month": month, "year": year}},
+        {"$lookup": {
+            "from": "spending_rollups",
+            "let": {"category": "$category"},
+            "pipeline": [
+                {"$match": {
+                    "user_id": user_id,
+                    "month": f"{year:04d}-{month:02d}",
+                    "$expr": {"$eq": ["$category", "$$category"]}
+                }},
+                {"$project": {"_id": 0, "total_cents": {"$add": [
+                    {"$ifNull": ["$total_cents", 0]},
+                    {"$multiply": [{"$ifNull": ["$total", 0]}, 100]}
+                ]}}}
+            ],
+            "as": "rollup"
+        }},
+        {"$project": {
+            "_id": 0,
+            "category": 1,
+            "limit": 1,
+            "spent_cents": {"$ifNull": [{"$sum": "$rollup.total_cents"}, 0]}
+        }},
+        {"$sort": {"category": 1}}
+    ]
 
-@api_router.get("/dashboard/stats")
-async def get_dashboard_stats(user_id: str = Depends(get_current_user)):
-    expenses = await db.expenses.find({"user_id": user_id}, {"_id": 0}).to_list(1000)
-    
-    if not expenses:
-        return {
-            "total_expenses": 0,
-            "expense_count": 0,
-            "top_category": "None",
-            "monthly_trend": [],
-            "category_breakdown": []
-        }
-    
-    # Calculate stats
-    total_expenses = sum(exp['amount'] for exp in expenses)
-    expense_count = len(expenses)
-    
-    # Category breakdown
-    category_totals = {}
-    for exp in expenses:
-        cat = exp['category']
-        category_totals[cat] = category_totals.get(cat, 0) + exp['amount']
-    
-    category_breakdown = [{"category": k, "amount": v} for k, v in category_totals.items()]
-    category_breakdown.sort(key=lambda x: x['amount'], reverse=True)
+async def budget_status_from_expenses(user_id: str, month: int, year: int) -> list:
+    """budget_status_pipeline rows computed from raw expenses, for users without built rollups"""
+    start = f"{year:04d}-{month:02d}-01"
+    end = f"{year:04d}-{month:02d}-{calendar.monthrange(year, month)[1]:02d}"
+    spending = await db.expenses.aggregate([
+        {"$match": with_clauses({"user_id": user_id}, expense_filter_clauses(start, end))},
+        {"$group": {"_id": "$category", "spent_cents": {"$sum": AMOUNT_CENTS_EXPR}}}
+    ]).to_list(None)
+    spent = {row["_id"]: row["spent_cents"] for row in spending}
+    budgets = await db.budgets.find(
+        {"user_id": user_id, "month": month, "year": year}, {"_id": 0, "category": 1, "limit": 1}
+    ).sort("category", 1).to_list(None)
+    return [{**b, "spent_cents": spent.get(b["category"], 0)} for b in budgets]
+
+@api_router.get("/budgets/status")
+async def get_budget_status(
+    month: Optional[int] = Query(None, ge=1, le=12),
+    year: Optional[int] = Query(None, ge=1900, le=9999),
+    user_id: str = Depends(get_current_user)
+):
+    """Spent, remaining and percent used for each budget of a month (default: current month)"""
+    today = datetime.now(timezone.utc)
+    month = month or today.month
+    year = year or today.year
     
-    top_category = category_breakdown[0]['category'] if category_breakdown else "None"
+    if await rollups_ready(user_id):
+        rows = await db.budgets.aggregate(budget_status_pipeline(user_id, month, year)).to_list(None)
+    else:
+        rows = await budget_status_from_expenses(user_id, month, year)
+    budgets = []
+    for row in rows:
+        spent = round(row['spent_cents']) / 100
+        budgets.append({
+            "category": row['category'],
+            "limit": row['limit'],
+            "spent": spent,
+            "remaining": round(row['limit'] - spent, 2),
+            "percent_used": round(spent / row['limit'] * 100, 1) if row['limit'] else None
+        })
     
-    # Monthly trend (last 6 months)
-    monthly_totals = {}
-    for exp in expenses:
-        month_key = exp['date'][:7]  # YYYY-MM
-        monthly_totals[month_key] = monthly_totals.get(month_key, 0) + exp['amount']
+    return {
+        "month": month,
+        "year": year,
+        "budgets": budgets,
+        "total_limit": round(sum(b['limit'] for b in budgets), 2),
+        "total_spent": round(sum(b['spent'] for b in budgets), 2)
+    }
+
+@api_router.get("/budgets", response_model=List[Budget])
+async def get_budgets(request: Request, response: Response, user_id: str = Depends(get_current_user)):
+    not_modified = await check_not_modified(request, response, user_id)
+    if not_modified:
+        return not_modified
+    budgets = await db.budgets.find({"user_id": user_id}, trusted_projection(Budget)).to_list(100)
     
-    monthly_trend = [{"month": k, "amount": v} for k, v in sorted(monthly_totals.items())[-6:]]
+    for budget in budgets:
+        if isinstance(budget.get('created_at'), str):
+            budget['created_at'] = datetime.fromisoformat(budget['created_at'])
     
+    if FAST_JSON_RESPONSES:
+        return carry_headers(FastJSONResponse(budgets), response)
+    return budgets
+
+# ==================== Sync Routes ====================
+
+def encode_sync_cursor(seq: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"seq": seq}).encode()).decode()
+
+def sync_response(full: bool, cursor: int, expenses: list, budgets: list, deleted: dict) -> Response:
+    """Encode a sync payload with the same datetime format as every other response"""
+    for budget in budgets:
+        if isinstance(budget.get('created_at'), str):
+            budget['created_at'] = datetime.fromisoformat(budget['created_at'])
+    return FastJSONResponse({
+        "full": full,
+        "cursor": encode_sync_cursor(cursor),
+        "expenses": [{**EXPENSE_DEFAULTS, **expense_from_doc(e)} for e in expenses],
+        "budgets": budgets,
+        "deleted": deleted
+    })
+
+def decode_sync_cursor(cursor: str) -> int:
+    try:
+        seq = json.loads(base64.urlsafe_b64decode(cursor.encode()))["seq"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+    if not isinstance(seq, int) or isinstance(seq, bool) or seq < 0:
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+    return seq
+
+@api_router.get("/sync")
+async def sync_changes(since: Optional[str] = None, user_id: str = Depends(get_current_user)):
+    """Expenses and budgets changed since ``since``, plus ids of those deleted.
+
+    Without ``since``, or when the cursor predates compacted tombstones, a full snapshot is
+    returned with ``full`` set and the client should replace its copy. Otherwise changes
+    are returned with ``full`` false and should be applied as upserts by id; a change may
+    be sent more than once. Pass the returned ``cursor`` as ``since`` on the next call.
+    """
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "change_seq": 1, "sync_floor": 1}) or {}
+    current = user.get("change_seq", 0)
+    since_seq = decode_sync_cursor(since) if since else None
+
+    if since_seq is None or since_seq < user.get("sync_floor", 0) or since_seq > current:
+        # The counter is read first, so anything written during the snapshot is resent next time
+        expenses = await db.expenses.find({"user_id": user_id}, EXPENSE_PROJECTION).sort(EXPENSE_SORT).to_list(None)
+        budgets = await db.budgets.find({"user_id": user_id}, trusted_projection(Budget)).to_list(None)
+        return sync_response(True, current, expenses, budgets, {"expenses": [], "budgets": []})
+
+    changed = {"user_id": user_id, "seq": {"$gt": max(0, since_seq - SYNC_RESCAN_WINDOW)}}
+    expenses = await db.expenses.find(changed, {**EXPENSE_PROJECTION, "seq": 1}).sort("seq", 1).to_list(None)
+    budgets = await db.budgets.find(changed, trusted_projection(Budget, seq=1)).sort("seq", 1).to_list(None)
+    tombstones = await db.tombstones.find(changed, {"_id": 0, "collection": 1, "id": 1, "seq": 1}).to_list(None)
+
+    cursor = max([since_seq] + [doc["seq"] for doc in expenses + budgets + tombstones])
+    deleted = {"expenses": [], "budgets": []}
+    for t in tombstones:
+        deleted[t["collection"]].append(t["id"])
+    for doc in expenses + budgets:
+        del doc["seq"]
+    return sync_response(False, cursor, expenses, budgets, deleted)
+
+async def compact_tombstones(retention_days: int = SYNC_TOMBSTONE_RETENTION_DAYS) -> int:
+    """Delete tombstones older than the retention; returns how many were removed.
+
+    Each affected user's sync_floor is raised to the newest removed sequence number first,
+    so a client whose cursor is below it gets a full snapshot instead of missing deletes.
+    """
+    from pymongo import UpdateOne
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    expired = {"deleted_at": {"$lt": cutoff}}
+    floors = await db.tombstones.aggregate([
+        {"$match": expired},
+        {"$group": {"_id": "$user_id", "seq": {"$max": "$seq"}}}
+    ]).to_list(None)
+    if not floors:
+        return 0
+    await db.users.bulk_write([
+        UpdateOne({"id": f["_id"]}, {"$max": {"sync_floor": f["seq"]}}) for f in floors
+    ], ordered=False)
+    result = await db.tombstones.delete_many(expired)
+    return result.deleted_count
+
+# ==================== Dashboard & Analytics ====================
+
+def dashboard_stats_pipeline(user_id: str) -> list:
+    """Aggregation computing all dashboard figures server-side in a single round trip"""
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$facet": {
+            "totals": [
+                {"$group": {"_id": None, "total_cents": {"$sum": AMOUNT_CENTS_EXPR}, "count": {"$sum": 1}}}
+            ],
+            "categories": [
+                {"$group": {"_id": "$category", "amount_cents": {"$sum": AMOUNT_CENTS_EXPR}}},
+                {"$sort": {"amount_cents": -1, "_id": 1}}
+            ],
+            "months": [
+                {"$group": {"_id": MONTH_EXPR, "amount_cents": {"$sum": AMOUNT_CENTS_EXPR}}},
+                {"$sort": {"_id": -1}},
+                {"$limit": 6},
+                {"$sort": {"_id": 1}}
+            ]
+        }}
+    ]
+
+def dashboard_stats_from_facets(result: dict) -> dict:
+    totals = result["totals"][0] if result.get("totals") else {"total_cents": 0, "count": 0}
+    category_breakdown = [{"category": c["_id"], "amount": round(c["amount_cents"]) / 100} for c in result.get("categories", [])]
+    monthly_trend = [{"month": m["_id"], "amount": round(m["amount_cents"]) / 100} for m in result.get("months", [])]
     return {
-        "total_expenses": total_expenses,
-        "expense_count": expense_count,
-        "top_category": top_category,
+        "total_expenses": round(totals["total_cents"]) / 100,
+        "expense_count": totals["count"],
+        "top_category": category_breakdown[0]["category"] if category_breakdown else "None",
         "monthly_trend": monthly_trend,
         "category_breakdown": category_breakdown
     }
 
+@api_router.get("/dashboard/stats")
+async def get_dashboard_stats(request: Request, response: Response, user_id: str = Depends(get_current_user)):
+    not_modified = await check_not_modified(request, response, user_id)
+    if not_modified:
+        return not_modified
+    if await rollups_ready(user_id):
+        return dashboard_stats_from_rollups(await get_stored_rollups(user_id))
+    
+    # Users whose rollups have not been built yet (see manage.py rollups rebuild)
+    results = await db.expenses.aggregate(dashboard_stats_pipeline(user_id)).to_list(1)
+    return dashboard_stats_from_facets(results[0] if results else {})
+
 # ==================== AI Financial Advisor ====================
 
 @api_router.get("/ai/financial-advice")
 async def get_financial_advice(user_id: str = Depends(get_current_user)):
-    advice = await generate_financial_advice(user_id)
-    
-    # Save insight to database
-    insight = AIInsight(
-        user_id=user_id,
-        insight_type="financial_advice",
-        content=advice
+    return await get_or_generate_advice(user_id)
+
+@api_router.get("/ai/financial-advice/stream")
+async def stream_financial_advice_events(user_id: str = Depends(get_current_user)):
+    """Server-Sent Events variant of /ai/financial-advice that forwards tokens as they arrive"""
+    return StreamingResponse(
+        stream_financial_advice(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    
-    insight_doc = insight.model_dump()
-    insight_doc['generated_at'] = insight_doc['generated_at'].isoformat()
-    
-    await db.ai_insights.insert_one(insight_doc)
-    
-    return {"advice": advice}
 
 @api_router.get("/ai/insights", response_model=List[AIInsight])
 async def get_ai_insights(user_id: str = Depends(get_current_user)):
-    insights = await db.ai_insights.find({"user_id": user_id}, {"_id": 0}).sort("generated_at", -1).limit(10).to_list(10)
+    insights = await db.ai_insights.find({"user_id": user_id}, trusted_projection(AIInsight)).sort("generated_at", -1).limit(10).to_list(10)
     
     for insight in insights:
         if isinstance(insight.get('generated_at'), str):
             insight['generated_at'] = datetime.fromisoformat(insight['generated_at'])
     
+    if FAST_JSON_RESPONSES:
+        defaults = model_defaults(AIInsight)
+        return FastJSONResponse([{**defaults, **insight} for insight in insights])
     return insights
 
+# ==================== Indexes ====================
+# (keys, options) per index. Plain tuples rather than IndexModel so that importing this
+# module does not load pymongo; ensure_indexes builds the models.
+
+INDEXES = {
+    "users": [
+        ([("email", 1)], {"unique": True, "name": "email_unique"}),
+        ([("id", 1)], {"unique": True, "name": "id_unique"}),
+    ],
+    "expenses": [
+        ([("user_id", 1), ("date", -1), ("id", -1)], {"name": "user_date_id"}),
+        ([("id", 1), ("user_id", 1)], {"unique": True, "name": "id_user"}),
+        ([("user_id", 1), ("created_at", -1)], {"name": "user_created_at"}),
+        ([("user_id", 1), ("category", 1), ("date", -1), ("id", -1)], {"name": "user_category_date_id"}),
+        ([("user_id", 1), ("description", "text")], {"name": "user_description_text"}),
+        ([("user_id", 1), ("seq", 1)], {"name": "user_seq"}),
+    ],
+    "budgets": [
+        ([("user_id", 1), ("category", 1), ("month", 1), ("year", 1)], {"unique": True, "name": "user_category_month_year"}),
+        ([("id", 1)], {"unique": True, "name": "id_unique"}),
+        ([("user_id", 1), ("seq", 1)], {"name": "user_seq"}),
+    ],
+    "tombstones": [
+        ([("user_id", 1), ("seq", 1)], {"name": "user_seq"}),
+        ([("deleted_at", 1)], {"name": "deleted_at"}),
+    ],
+    "ai_insights": [
+        ([("user_id", 1), ("generated_at", -1)], {"name": "user_generated_at"}),
+        ([("user_id", 1), ("insight_type", 1), ("fingerprint", 1), ("generated_at", -1)], {"name": "user_type_fingerprint"}),
+    ],
+    "spending_rollups": [
+        ([("user_id", 1), ("month", 1), ("category", 1)], {"unique": True, "name": "user_month_category"}),
+    ],
+    "category_cache": [
+        ([("key", 1)], {"unique": True, "name": "key_unique"}),
+        ([("expires_at", 1)], {"expireAfterSeconds": 0, "name": "expires_at_ttl"}),
+    ],
+    "categorization_jobs": [
+        ([("available_at", 1)], {"name": "available_at"}),
+        ([("id", 1)], {"unique": True, "name": "id_unique"}),
+    ],
+}
+
+async def dedupe_budgets() -> int:
+    """Remove duplicate budgets so the unique user_category_month_year index can be built.
+
+    Concurrent creates used to insert the same (user, category, month, year) twice. The most
+    recently inserted copy is kept, since it holds the limit the user set last. Returns the
+    number of budgets removed.
+    """
+    duplicates = await db.budgets.aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"user_id": "$user_id", "category": "$category", "month": "$month", "year": "$year"},
+            "ids": {"$push": "$id"},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}}
+    ], allowDiskUse=True).to_list(None)
+
+    removed = 0
+    for group in duplicates:
+        user_id, extra_ids = group["_id"]["user_id"], group["ids"][:-1]
+        seq = await next_change_seq(user_id)
+        result = await db.budgets.delete_many({"user_id": user_id, "id": {"$in": extra_ids}})
+        await record_tombstones(user_id, "budgets", extra_ids, seq)
+        await bump_data_version(user_id)
+        removed += result.deleted_count
+    return removed
+
+async def ensure_indexes() -> dict:
+    """Create every declared index; safe to run repeatedly.
+
+    Each collection is attempted even if an earlier one fails (for example a unique index
+    over existing duplicates). Returns ``created`` index names and ``failed`` error messages,
+    both keyed by collection.
+    """
+    from pymongo import IndexModel
+    created, failed = {}, {}
+    for collection, indexes in INDEXES.items():
+        try:
+            models = [IndexModel(keys, **options) for keys, options in indexes]
+            created[collection] = await db[collection].create_indexes(models)
+        except Exception as e:
+            failed[collection] = str(e)
+    return {"created": created, "failed": failed}
+
+def route_query_plans(user_id: str = "explain-user") -> list:
+    """One representative query per database access, used to check that each is index-backed"""
+    expense_id = "explain-expense"
+    now = datetime.now(timezone.utc)
+    keyset_after = encode_expense_cursor({"date": expense_date_to_bson("2024-01-01"), "id": expense_id})
+    return [
+        {"route": "POST /auth/register, POST /auth/login", "collection": "users", "filter": {"email": "explain@example.com"}},
+        {"route": "GET /auth/me", "collection": "users", "filter": {"id": user_id}},
+        {"route": "GET /expenses", "collection": "expenses", "filter": {"user_id": user_id}, "sort": EXPENSE_SORT},
+        {"route": "GET /expenses?after=", "collection": "expenses", "filter": expense_page_query(user_id, keyset_after), "sort": EXPENSE_SORT},
+        {"route": "GET /expenses?from=&to=", "collection": "expenses", "filter": with_clauses({"user_id": user_id}, expense_filter_clauses("2024-01-01", "2024-01-31")), "sort": EXPENSE_SORT},
+        {"route": "GET /expenses?category=", "collection": "expenses", "filter": with_clauses({"user_id": user_id}, expense_filter_clauses(category="Food")), "sort": EXPENSE_SORT},
+        {"route": "GET /expenses/search", "collection": "expenses", "filter": expense_search_query(user_id, "coffee")},
+        {"route": "GET /sync", "collection": "expenses", "filter": {"user_id": user_id, "seq": {"$gt": 0}}, "sort": [("seq", 1)]},
+        {"route": "GET /sync", "collection": "budgets", "filter": {"user_id": user_id, "seq": {"$gt": 0}}, "sort": [("seq", 1)]},
+        {"route": "GET /sync", "collection": "tombstones", "filter": {"user_id": user_id, "seq": {"$gt": 0}}},
+        {"route": "manage.py sync compact", "collection": "tombstones", "filter": {"deleted_at": {"$lt": now}}},
+        {"route": "GET/DELETE /expenses/{id}", "collection": "expenses", "filter": {"id": expense_id, "user_id": user_id}},
+        {"route": "local classifier training", "collection": "expenses", "filter": {"user_id": user_id, "category_pending": {"$ne": True}, "category": {"$ne": PENDING_CATEGORY}}, "sort": [("created_at", -1)]},
+        {"route": "GET /dashboard/stats (fallback)", "collection": "expenses", "pipeline": dashboard_stats_pipeline(user_id)},
+        {"route": "GET /dashboard/stats", "collection": "spending_rollups", "filter": {"user_id": user_id, "count": {"$gt": 0}}},
+        {"route": "POST /budgets", "collection": "budgets", "filter": {"user_id": user_id, "category": "Food", "month": 1, "year": 2024}},
+        {"route": "GET /budgets", "collection": "budgets", "filter": {"user_id": user_id}},
+        {"route": "GET /budgets/status", "collection": "budgets", "pipeline": budget_status_pipeline(user_id, 1, 2024)},
+        {"route": "GET /ai/financial-advice", "collection": "ai_insights", "filter": {"user_id": user_id, "insight_type": "financial_advice", "fingerprint": "x"}, "sort": [("generated_at", -1)]},
+        {"route": "GET /ai/insights", "collection": "ai_insights", "filter": {"user_id": user_id}, "sort": [("generated_at", -1)]},
+        {"route": "AI categorization cache", "collection": "category_cache", "filter": {"key": "coffee", "expires_at": {"$gt": now}}},
+        {"route": "categorization worker", "collection": "categorization_jobs", "filter": {"available_at": {"$lte": now}}, "sort": [("available_at", 1)]},
+    ]
+
+def find_plan_stages(plan, stage: str) -> bool:
+    """True if any node of an explain() plan tree uses the given stage"""
+    if isinstance(plan, dict):
+        if plan.get("stage") == stage:
+            return True
+        return any(find_plan_stages(v, stage) for v in plan.values())
+    if isinstance(plan, list):
+        return any(find_plan_stages(v, stage) for v in plan)
+    return False
+
+async def explain_route_queries() -> list:
+    """Run explain() on every route query; each result has route, collection and collscan"""
+    results = []
+    for q in route_query_plans():
+        if "pipeline" in q:
+            command = {"aggregate": q["collection"], "pipeline": q["pipeline"], "cursor": {}}
+        else:
+            command = {"find": q["collection"], "filter": q["filter"]}
+            if q.get("sort"):
+                command["sort"] = dict(q["sort"])
+        plan = await db.command("explain", command, verbosity="queryPlanner")
+        results.append({
+            "route": q["route"],
+            "collection": q["collection"],
+            "collscan": find_plan_stages(plan, "COLLSCAN")
+        })
+    return results
+
+# ==================== Storage Migration ====================
+# Converts documents written before native dates and integer cents. Each collection is
+# walked in _id order in small batches and the last converted _id is checkpointed in the
+# migrations collection, so an interrupted run resumes where it stopped.
+
+MIGRATION_BATCH_SIZE = int(os.environ.get('MIGRATION_BATCH_SIZE', '500'))
+
+def parse_legacy_timestamp(value):
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+def migrate_expense_doc(doc: dict) -> tuple:
+    """($set, $unset) converting one legacy expense; fields that cannot be parsed are left as-is"""
+    changes, removals = {}, {}
+    if isinstance(doc.get('date'), str):
+        try:
+            changes['date'] = expense_date_to_bson(doc['date'])
+        except ValueError:
+            pass
+    created_at = parse_legacy_timestamp(doc.get('created_at'))
+    if created_at:
+        changes['created_at'] = created_at
+    if 'amount' in doc and 'amount_cents' not in doc:
+        changes['amount_cents'] = to_cents(doc['amount'])
+        removals['amount'] = ""
+    return changes, removals
+
+def timestamp_migration(field: str):
+    def migrate(doc: dict) -> tuple:
+        parsed = parse_legacy_timestamp(doc.get(field))
+        return ({field: parsed} if parsed else {}), {}
+    return migrate
+
+STORAGE_MIGRATIONS = {
+    "expenses": (
+        {"$or": [{"date": {"$type": "string"}}, {"created_at": {"$type": "string"}}, {"amount": {"$exists": True}}]},
+        migrate_expense_doc
+    ),
+    "users": ({"created_at": {"$type": "string"}}, timestamp_migration("created_at")),
+    "budgets": ({"created_at": {"$type": "string"}}, timestamp_migration("created_at")),
+    "ai_insights": ({"generated_at": {"$type": "string"}}, timestamp_migration("generated_at")),
+}
+
+async def migrate_storage(collection: str, batch_size: int = MIGRATION_BATCH_SIZE, pause: float = 0, restart: bool = False) -> dict:
+    """Convert one collection's legacy documents batch by batch; returns scanned/converted/skipped counts"""
+    from pymongo import UpdateOne
+    legacy_filter, convert = STORAGE_MIGRATIONS[collection]
+    checkpoint_id = f"storage:{collection}"
+    if restart:
+        await db.migrations.delete_one({"_id": checkpoint_id})
+    checkpoint = await db.migrations.find_one({"_id": checkpoint_id}) or {}
+    last_id = checkpoint.get("last_id")
+    counts = {"scanned": 0, "converted": 0, "skipped": 0}
+
+    while True:
+        query = dict(legacy_filter)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await db[collection].find(query).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+
+        operations = []
+        for doc in batch:
+            changes, removals = convert(doc)
+            if not changes and not removals:
+                counts["skipped"] += 1
+                continue
+            update = {"$set": changes}
+            if removals:
+                update["$unset"] = removals
+            operations.append(UpdateOne({"_id": doc["_id"]}, update))
+        if operations:
+            await db[collection].bulk_write(operations, ordered=False)
+
+        counts["scanned"] += len(batch)
+        counts["converted"] += len(operations)
+        last_id = batch[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": checkpoint_id},
+            {"$set": {"last_id": last_id, "updated_at": datetime.now(timezone.utc)}, "$inc": {"converted": len(operations)}},
+            upsert=True
+        )
+        if pause:
+            await asyncio.sleep(pause)
+
+    return counts
+
+# ==================== Status ====================
+
+@api_router.get("/status")
+async def get_status():
+    return {
+        "password_hashing": password_pool.stats(),
+        "categorization_cache": category_cache.stats(),
+        "local_classifier": local_categorizer.stats(),
+        "categorization_batching": categorization_batcher.stats(),
+        "categorization_worker": categorization_worker.stats(),
+        "financial_advice": advice_single_flight.stats(),
+        "financial_advice_streaming": advice_stream_stats.stats(),
+        "llm": llm_stats()
+    }
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of the process-local metrics"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Include router
 app.include_router(api_router)
 
@@ -438,6 +3110,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 logging.basicConfig(
     level=logging.INFO,
@@ -445,9 +3118,27 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    if ENSURE_INDEXES_ON_STARTUP:
+        try:
+            result = await ensure_indexes()
+        except Exception as e:
+            logger.error(f"Index creation failed: {e}")
+        else:
+            for collection, error in result["failed"].items():
+                logger.error(f"Index creation failed for {collection}: {error}")
+
+@app.on_event("startup")
+async def start_categorization_worker():
+    # Pick up jobs left over from a previous run
+    categorization_worker.ensure_running()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    categorization_worker.stop()
+    close_mongo_client()
+    password_pool.shutdown()
 
 # Vercel serverless handler using Mangum
 from mangum import Mangum
@@ -3,6 +3,7 @@ import sys
 import json
 from datetime import datetime, timedelta
 import time
+import base64
 
 class ExpenseTrackerAPITester:
     def __init__(self, base_url="https://budget-insight-20.preview.emergentagent.com"):
@@ -48,6 +49,8 @@ class ExpenseTrackerAPITester:
                 response = requests.get(url, headers=test_headers, timeout=30)
             elif method == 'POST':
                 response = requests.post(url, json=data, headers=test_headers, timeout=30)
+            elif method == 'PUT':
+                response = requests.put(url, json=data, headers=test_headers, timeout=30)
             elif method == 'DELETE':
                 response = requests.delete(url, headers=test_headers, timeout=30)
 
@@ -201,6 +204,122 @@ class ExpenseTrackerAPITester:
             print(f"   Found {len(response)} expenses")
         return success
 
+    def test_get_expenses_paginated(self):
+        """Test getting a single page of expenses"""
+        success, response = self.run_test(
+            "Get Expenses Page",
+            "GET",
+            "expenses?limit=1",
+            200
+        )
+        
+        if success and len(response) > 1:
+            self.log_test("Expenses Page Respects Limit", False, f"Expected at most 1 expense, got {len(response)}")
+            return False
+        return success
+
+    def test_get_expenses_filtered(self):
+        """Test server-side date, category and amount filters and field selection"""
+        today = datetime.now().strftime("%Y-%m-%d")
+        expense_id = self.create_expense_quietly("Filter check movie", "Entertainment")
+        if not expense_id:
+            self.log_test("Get Filtered Expenses", False, "Could not create an expense to filter for")
+            return False
+        
+        success, response = self.run_test(
+            "Get Filtered Expenses",
+            "GET",
+            f"expenses?from={today}&to={today}&category=Entertainment&min_amount=5&max_amount=20",
+            200
+        )
+        if not success:
+            return False
+        
+        ok = (expense_id in [e['id'] for e in response]
+              and all(e['category'] == "Entertainment" and e['date'] == today and 5 <= e['amount'] <= 20 for e in response))
+        self.log_test("Filters Match Only Requested Expenses", ok, "" if ok else f"Expected {expense_id} and only matching rows, got {response}")
+        
+        success, response = self.run_test(
+            "Get Expenses With Selected Fields",
+            "GET",
+            "expenses?category=Entertainment&fields=id,amount",
+            200
+        )
+        if success:
+            ok = bool(response) and all(set(e) == {"id", "amount"} for e in response)
+            self.log_test("Fields Returns Only Requested Fields", ok, "" if ok else f"Expected id and amount only, got {response[:3]}")
+        
+        success, _ = self.run_test(
+            "Filter Rejects Invalid Date",
+            "GET",
+            "expenses?from=03/05/2024",
+            400
+        )
+        return success
+
+    def test_search_expenses(self):
+        """Test full-text search over expense descriptions"""
+        expense_id = self.create_expense_quietly("Search check zumba classes")
+        if not expense_id:
+            self.log_test("Search Expenses", False, "Could not create an expense to search for")
+            return False
+        
+        # Stemming and case folding: "Zumba class" should find "zumba classes"
+        success, response = self.run_test(
+            "Search Expenses",
+            "GET",
+            "expenses/search?q=Zumba%20class",
+            200
+        )
+        if not success:
+            return False
+        
+        ok = bool(response) and response[0]['id'] == expense_id and all('score' in e for e in response)
+        self.log_test("Search Ranks Matching Expense First", ok, "" if ok else f"Expected {expense_id} first with scores, got {response}")
+        
+        success, response = self.run_test(
+            "Search Without Matches",
+            "GET",
+            "expenses/search?q=qwertyuiopasdfgh",
+            200
+        )
+        if success and response:
+            self.log_test("Search Without Matches Is Empty", False, f"Expected no results, got {response}")
+            return False
+        
+        success, _ = self.run_test(
+            "Search Requires Query",
+            "GET",
+            "expenses/search",
+            422
+        )
+        return success
+
+    def test_bulk_import_expenses(self):
+        """Test importing expenses from JSON lines"""
+        rows = [
+            {"amount": 4.25, "description": "Coffee", "date": datetime.now().strftime("%Y-%m-%d"), "category": "Food"},
+            {"amount": "not a number", "description": "Broken row", "date": datetime.now().strftime("%Y-%m-%d")}
+        ]
+        url = f"{self.api_url}/expenses/bulk"
+        print("\n🔍 Testing Bulk Import Expenses...")
+        print(f"   URL: {url}")
+        
+        try:
+            response = requests.post(
+                url,
+                data="\n".join(json.dumps(row) for row in rows),
+                headers={'Content-Type': 'application/x-ndjson', 'Authorization': f'Bearer {self.token}'},
+                timeout=30
+            )
+            result = response.json()
+            success = response.status_code == 200 and result.get('inserted') == 1 and result.get('failed') == 1
+            self.log_test("Bulk Import Expenses", success, "" if success else f"Got {response.status_code} - {result}")
+            return success
+        except Exception as e:
+            self.log_test("Bulk Import Expenses", False, f"Exception: {str(e)}")
+            return False
+
     def test_delete_expense(self, expense_id):
         """Test deleting an expense"""
         if not expense_id:
@@ -234,6 +353,45 @@ class ExpenseTrackerAPITester:
         )
         return success
 
+    def test_set_month_budgets(self):
+        """Test setting a whole month's budgets at once"""
+        current_date = datetime.now()
+        budget_data = {
+            "month": current_date.month,
+            "year": current_date.year,
+            "budgets": [
+                {"category": "Food", "limit": 450.00},
+                {"category": "Transportation", "limit": 120.00}
+            ]
+        }
+        
+        success, response = self.run_test(
+            "Set Month Budgets",
+            "PUT",
+            "budgets",
+            200,
+            data=budget_data
+        )
+        
+        if success:
+            print(f"   Month now has {len(response)} budgets")
+        return success
+
+    def test_budget_status(self):
+        """Test getting budget vs actual for the current month"""
+        current_date = datetime.now()
+        success, response = self.run_test(
+            "Get Budget Status",
+            "GET",
+            f"budgets/status?month={current_date.month}&year={current_date.year}",
+            200
+        )
+        
+        if success:
+            for budget in response.get('budgets', []):
+                print(f"   {budget['category']}: ${budget['spent']:.2f} of ${budget['limit']:.2f}")
+        return success
+
     def test_get_budgets(self):
         """Test getting all budgets"""
         success, response = self.run_test(
@@ -247,6 +405,109 @@ class ExpenseTrackerAPITester:
             print(f"   Found {len(response)} budgets")
         return success
 
+    def create_expense_quietly(self, description, category="Other"):
+        """Create an expense for a later check without counting it as a test"""
+        response = requests.post(
+            f"{self.api_url}/expenses",
+            json={"amount": 9.99, "description": description, "date": datetime.now().strftime("%Y-%m-%d"), "category": category},
+            headers={'Authorization': f'Bearer {self.token}'},
+            timeout=30
+        )
+        return response.json().get('id') if response.status_code == 200 else None
+
+    def sync_cursor_seq(self, cursor):
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))["seq"]
+
+    def test_sync_snapshot(self):
+        """Test that a sync without a cursor returns a full snapshot"""
+        success, response = self.run_test(
+            "Sync Full Snapshot",
+            "GET",
+            "sync",
+            200
+        )
+        
+        if success and not (response.get('full') and response.get('cursor')):
+            self.log_test("Sync Snapshot Is Full", False, f"Expected full=true with a cursor, got {response}")
+            return None
+        if success:
+            print(f"   Snapshot has {len(response['expenses'])} expenses and {len(response['budgets'])} budgets")
+        return response.get('cursor')
+
+    def test_expense_batch(self):
+        """Test batch delete and recategorize with per-item outcomes"""
+        to_delete = self.create_expense_quietly("Batch delete me")
+        to_update = self.create_expense_quietly("Batch recategorize me", "Food")
+        if not to_delete or not to_update:
+            self.log_test("Expense Batch", False, "Could not create expenses for the batch")
+            return None
+        
+        success, response = self.run_test(
+            "Expense Batch",
+            "POST",
+            "expenses/batch",
+            200,
+            data={
+                "delete": [to_delete, "no-such-expense", to_delete],
+                "recategorize": [{"id": to_update, "category": "Shopping"}]
+            }
+        )
+        if not success:
+            return None
+        
+        statuses = [r['status'] for r in response.get('results', [])]
+        expected = ["deleted", "not_found", "duplicate", "updated"]
+        ok = statuses == expected and response.get('deleted') == 1 and response.get('updated') == 1
+        self.log_test("Expense Batch Outcomes", ok, "" if ok else f"Expected {expected}, got {response}")
+        return to_delete
+
+    def test_sync_changes(self, cursor, deleted_id):
+        """Test that a delta sync returns new expenses, tombstones, and re-sends the rescan window"""
+        if not cursor:
+            self.log_test("Sync Changes", False, "No cursor from the snapshot")
+            return False
+        
+        added_id = self.create_expense_quietly("Synced expense")
+        success, response = self.run_test(
+            "Sync Changes Since Cursor",
+            "GET",
+            f"sync?since={cursor}",
+            200
+        )
+        if not success:
+            return False
+        
+        expense_ids = [e['id'] for e in response.get('expenses', [])]
+        deleted = response.get('deleted', {}).get('expenses', [])
+        ok = (not response.get('full') and added_id in expense_ids and deleted_id in deleted
+              and self.sync_cursor_seq(response['cursor']) > self.sync_cursor_seq(cursor))
+        self.log_test("Sync Returns Changes And Tombstones", ok, "" if ok else f"Added {added_id}, deleted {deleted_id}, got {response}")
+        
+        # Changes just below the cursor are re-read in case writes committed out of order,
+        # so an immediate re-sync sends the newest change again and never moves the cursor back
+        success, again = self.run_test(
+            "Sync Again With New Cursor",
+            "GET",
+            f"sync?since={response['cursor']}",
+            200
+        )
+        if not success:
+            return False
+        resent = [e['id'] for e in again.get('expenses', [])]
+        ok = added_id in resent and self.sync_cursor_seq(again['cursor']) >= self.sync_cursor_seq(response['cursor'])
+        self.log_test("Sync Rescan Window Re-sends Recent Changes", ok, "" if ok else f"Expected {added_id} again, got {again}")
+        return ok
+
+    def test_sync_invalid_cursor(self):
+        """Test that a malformed sync cursor is rejected"""
+        success, _ = self.run_test(
+            "Sync Rejects Invalid Cursor",
+            "GET",
+            "sync?since=not-a-cursor",
+            400
+        )
+        return success
+
     def test_dashboard_stats(self):
         """Test getting dashboard statistics"""
         success, response = self.run_test(
@@ -262,6 +523,43 @@ class ExpenseTrackerAPITester:
             print(f"   Top category: {response.get('top_category', 'None')}")
         return success
 
+    def get_with_etag(self, endpoint, etag=None):
+        """GET an endpoint, optionally revalidating a cached copy; returns (status, ETag)"""
+        headers = {'Authorization': f'Bearer {self.token}'}
+        if etag:
+            headers['If-None-Match'] = etag
+        response = requests.get(f"{self.api_url}/{endpoint}", headers=headers, timeout=30)
+        return response.status_code, response.headers.get('ETag')
+
+    def test_conditional_requests(self):
+        """Test ETag / If-None-Match revalidation and that a write changes the ETag"""
+        print("\n🔍 Testing Conditional Requests...")
+        ok = True
+        for endpoint in ["expenses", "budgets", "dashboard/stats"]:
+            try:
+                status, etag = self.get_with_etag(endpoint)
+                revalidated, _ = self.get_with_etag(endpoint, etag) if etag else (None, None)
+            except Exception as e:
+                self.log_test(f"ETag Revalidation ({endpoint})", False, f"Exception: {str(e)}")
+                ok = False
+                continue
+            passed = status == 200 and bool(etag) and revalidated == 304
+            self.log_test(f"ETag Revalidation ({endpoint})", passed,
+                          "" if passed else f"Expected 200 with an ETag then 304, got {status} {etag!r} then {revalidated}")
+            ok = ok and passed
+        
+        try:
+            _, before = self.get_with_etag("expenses")
+            self.create_expense_quietly("ETag check")
+            status, after = self.get_with_etag("expenses", before)
+        except Exception as e:
+            self.log_test("ETag Changes After Write", False, f"Exception: {str(e)}")
+            return False
+        passed = status == 200 and bool(after) and after != before
+        self.log_test("ETag Changes After Write", passed,
+                      "" if passed else f"Expected 200 with a new ETag, got {status} {before!r} -> {after!r}")
+        return ok and passed
+
     def test_ai_financial_advice(self):
         """Test AI financial advice generation"""
         print(f"\n🔍 Testing AI Financial Advice...")
@@ -312,6 +610,10 @@ class ExpenseTrackerAPITester:
         expense_id_ai = self.test_add_expense_with_ai()
         expense_id_manual = self.test_add_expense_manual()
         self.test_get_expenses()
+        self.test_get_expenses_paginated()
+        self.test_get_expenses_filtered()
+        self.test_search_expenses()
+        self.test_bulk_import_expenses()
         
         # Test deletion with one of the created expenses
         if expense_id_manual:
@@ -320,11 +622,21 @@ class ExpenseTrackerAPITester:
         # Budget Management Tests
         print("\n📊 BUDGET MANAGEMENT TESTS")
         self.test_set_budget()
+        self.test_set_month_budgets()
         self.test_get_budgets()
+        self.test_budget_status()
+
+        # Sync & Batch Tests
+        print("\n🔄 SYNC & BATCH TESTS")
+        sync_cursor = self.test_sync_snapshot()
+        batch_deleted_id = self.test_expense_batch()
+        self.test_sync_changes(sync_cursor, batch_deleted_id)
+        self.test_sync_invalid_cursor()
 
         # Analytics Tests
         print("\n📈 ANALYTICS TESTS")
         self.test_dashboard_stats()
+        self.test_conditional_requests()
 
         # AI Features Tests
         print("\n🤖 AI FEATURES TESTS")
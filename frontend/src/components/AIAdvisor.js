@@ -8,6 +8,16 @@ import { Sparkles, Loader2 } from "lucide-react";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const parseSseEvent = (raw) => {
+  let type = "message";
+  let data = "";
+  for (const line of raw.split("\n")) {
+    if (line.startsWith("event:")) type = line.slice(6).trim();
+    else if (line.startsWith("data:")) data += line.slice(5).trim();
+  }
+  return { type, data: data ? JSON.parse(data) : {} };
+};
+
 export default function AIAdvisor() {
   const [advice, setAdvice] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -15,8 +25,36 @@ export default function AIAdvisor() {
   const getAdvice = async () => {
     setLoading(true);
     try {
-      const response = await axios.get(`${API}/ai/financial-advice`);
-      setAdvice(response.data.advice);
+      // Stream the advice so tokens show up as soon as the model produces them
+      const response = await fetch(`${API}/ai/financial-advice/stream`, {
+        headers: { Authorization: axios.defaults.headers.common["Authorization"] },
+      });
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let text = "";
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split("\n\n");
+        buffer = events.pop();
+        for (const raw of events) {
+          const event = parseSseEvent(raw);
+          if (event.type === "token") {
+            text += event.data.text;
+            setAdvice(text);
+          } else if (event.type === "done") {
+            setAdvice(event.data.advice);
+          } else if (event.type === "error") {
+            throw new Error(event.data.detail);
+          }
+        }
+      }
     } catch (error) {
       toast.error("Failed to generate advice");
     } finally {
@@ -0,0 +1,37 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# server reads these at import time; no database is contacted until a query runs
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("ENSURE_INDEXES_ON_STARTUP", "false")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """An in-memory database in place of MongoDB; skipped when mongomock_motor is not installed"""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import server
+
+    database = mongomock_motor.AsyncMongoMockClient(tz_aware=True)["test"]
+    monkeypatch.setattr(server, "db", database)
+    return database
+
+
+@pytest.fixture
+def client(db):
+    """API client signed in as user "u1", whose user document is already stored"""
+    import asyncio
+
+    from fastapi.testclient import TestClient
+
+    import server
+
+    asyncio.run(db.users.insert_one({"id": "u1", "email": "u1@example.com", "name": "U1", "rollups_built": True}))
+    server.app.dependency_overrides[server.get_current_user] = lambda: "u1"
+    yield TestClient(server.app)
+    server.app.dependency_overrides.pop(server.get_current_user, None)
@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+class StubAdvisor:
+    """Stands in for the financial advisor LlmClient"""
+
+    def __init__(self):
+        self.calls = 0
+        self.delay = 0.02
+        self.error = None
+
+    async def send(self, purpose: str, context: str) -> str:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return f"advice #{self.calls} for {context}"
+
+
+@pytest.fixture
+def advice(monkeypatch):
+    """In-memory insights and spending context; returns (advisor, contexts, stored insights)"""
+    advisor = StubAdvisor()
+    contexts = {"u1": "Food: $120"}
+    insights = []
+
+    async def build_advice_context(user_id):
+        return contexts.get(user_id)
+
+    async def save_advice_insight(user_id, text, fingerprint):
+        insights.append({"user_id": user_id, "content": text, "fingerprint": fingerprint})
+
+    async def find_cached_advice(user_id, fingerprint):
+        matches = [i for i in insights if i["user_id"] == user_id and i["fingerprint"] == fingerprint]
+        return matches[-1]["content"] if matches else None
+
+    async def find_latest_advice(user_id):
+        matches = [i for i in insights if i["user_id"] == user_id]
+        return matches[-1]["content"] if matches else None
+
+    monkeypatch.setattr(server, "build_advice_context", build_advice_context)
+    monkeypatch.setattr(server, "save_advice_insight", save_advice_insight)
+    monkeypatch.setattr(server, "find_cached_advice", find_cached_advice)
+    monkeypatch.setattr(server, "find_latest_advice", find_latest_advice)
+    monkeypatch.setattr(server, "financial_advisor_client", lambda: advisor)
+    monkeypatch.setattr(server, "advice_single_flight", server.PerUserSingleFlight())
+    return advisor, contexts, insights
+
+
+def concurrently(count: int, user_id: str = "u1") -> list:
+    async def scenario():
+        return await asyncio.gather(*(server.get_or_generate_advice(user_id) for _ in range(count)))
+    return asyncio.run(scenario())
+
+
+def test_concurrent_requests_share_one_generation(advice):
+    advisor, _, insights = advice
+
+    results = concurrently(5)
+
+    assert advisor.calls == 1
+    assert len(insights) == 1
+    assert {r["advice"] for r in results} == {"advice #1 for Food: $120"}
+    assert server.advice_single_flight.stats()["started"] == 1
+    assert server.advice_single_flight.stats()["deduplicated"] == 4
+
+
+def test_unchanged_data_is_served_from_the_fingerprint_cache(advice):
+    advisor, _, _ = advice
+
+    first = asyncio.run(server.get_or_generate_advice("u1"))
+    second = asyncio.run(server.get_or_generate_advice("u1"))
+
+    assert first == {"advice": "advice #1 for Food: $120", "cached": False}
+    assert second == {"advice": "advice #1 for Food: $120", "cached": True}
+    assert advisor.calls == 1
+
+
+def test_changed_data_misses_the_fingerprint_cache(advice):
+    advisor, contexts, _ = advice
+
+    asyncio.run(server.get_or_generate_advice("u1"))
+    contexts["u1"] = "Food: $120, Bills: $80"
+    result = asyncio.run(server.get_or_generate_advice("u1"))
+
+    assert result == {"advice": "advice #2 for Food: $120, Bills: $80", "cached": False}
+    assert advisor.calls == 2
+
+
+def test_leader_failure_is_shared_and_falls_back(advice):
+    advisor, _, _ = advice
+    advisor.error = server.LlmUnavailable("LLM circuit open for financial_advice")
+
+    results = concurrently(3)
+
+    assert advisor.calls == 1
+    assert results == [{"advice": server.ADVICE_UNAVAILABLE, "cached": False}] * 3
+
+
+def test_leader_failure_falls_back_to_latest_advice(advice):
+    advisor, contexts, _ = advice
+    asyncio.run(server.get_or_generate_advice("u1"))
+    contexts["u1"] = "Food: $300"
+    advisor.error = RuntimeError("upstream error")
+
+    results = concurrently(3)
+
+    assert advisor.calls == 2
+    assert results == [{"advice": "advice #1 for Food: $120", "cached": True}] * 3
+
+
+def test_cancelled_leader_hands_generation_to_a_waiter(advice):
+    advisor, _, insights = advice
+
+    async def scenario():
+        leader = asyncio.create_task(server.get_or_generate_advice("u1"))
+        await asyncio.sleep(0.005)
+        waiters = [asyncio.create_task(server.get_or_generate_advice("u1")) for _ in range(3)]
+        await asyncio.sleep(0.005)
+        leader.cancel()
+        results = await asyncio.gather(*waiters)
+        return leader.cancelled(), results
+
+    leader_cancelled, results = asyncio.run(scenario())
+
+    assert leader_cancelled
+    # The cancelled generation is retried once by a waiter; the others share that retry
+    assert advisor.calls == 2
+    assert results == [{"advice": "advice #2 for Food: $120", "cached": False}] * 3
+    assert len(insights) == 1
+
+
+def test_different_fingerprint_waits_for_running_generation(advice):
+    advisor, contexts, _ = advice
+
+    async def scenario():
+        first = asyncio.create_task(server.get_or_generate_advice("u1"))
+        await asyncio.sleep(0.005)
+        contexts["u1"] = "Food: $999"
+        second = await server.get_or_generate_advice("u1")
+        return first.done(), second
+
+    first_done, second = asyncio.run(scenario())
+
+    assert first_done
+    assert second == {"advice": "advice #2 for Food: $999", "cached": False}
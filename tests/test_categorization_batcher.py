@@ -0,0 +1,114 @@
+import asyncio
+import json
+
+import pytest
+
+import server
+
+
+class StubLlm:
+    """Stands in for the shared LlmClient; answers every prompt with `reply(text)`"""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.prompts = []
+
+    async def send(self, purpose: str, text: str) -> str:
+        self.prompts.append((purpose, text))
+        return self.reply(text)
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    stub = StubLlm(lambda text: "Other")
+    monkeypatch.setattr(server, "get_llm_client", lambda *args, **kwargs: stub)
+    return stub
+
+
+def categories_for(names: dict):
+    """Reply with the category of every listed description, matched by its first word"""
+    def reply(text: str) -> str:
+        lines = text.splitlines()[1:]
+        return json.dumps([names[line.split("'")[1].split()[0]] for line in lines])
+    return reply
+
+
+def submit_all(batcher, items) -> list:
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(d, a) for d, a in items), return_exceptions=True)
+    return asyncio.run(scenario())
+
+
+def test_window_flush_sends_one_prompt_and_maps_results(llm):
+    llm.reply = categories_for({"Uber": "Transportation", "Pizza": "Food", "Netflix": "Entertainment"})
+    batcher = server.CategorizationBatcher(window_ms=10, max_size=20)
+
+    results = submit_all(batcher, [("Uber ride", 12), ("Pizza night", 30), ("Netflix plan", 15)])
+
+    assert results == ["Transportation", "Food", "Entertainment"]
+    assert [purpose for purpose, _ in llm.prompts] == ["categorize_batch"]
+    assert batcher.stats()["batches"] == 1 and batcher.stats()["items"] == 3
+
+
+def test_full_batch_flushes_before_the_window(llm):
+    llm.reply = categories_for({"Uber": "Transportation", "Pizza": "Food", "Netflix": "Entertainment", "Rent": "Bills"})
+    batcher = server.CategorizationBatcher(window_ms=60_000, max_size=2)
+
+    async def scenario():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(d, 1) for d in ("Uber ride", "Pizza night", "Netflix plan", "Rent due"))),
+            timeout=5
+        )
+
+    assert asyncio.run(scenario()) == ["Transportation", "Food", "Entertainment", "Bills"]
+    assert len(llm.prompts) == 2
+    assert batcher._timer is None
+
+
+def test_same_description_is_sent_once(llm):
+    llm.reply = lambda text: "Food"
+    batcher = server.CategorizationBatcher(window_ms=10, max_size=20)
+
+    assert submit_all(batcher, [("Coffee", 3), ("  coffee ", 4)]) == ["Food", "Food"]
+    assert [purpose for purpose, _ in llm.prompts] == ["categorize"]
+
+
+def test_unknown_categories_become_other(llm):
+    llm.reply = lambda text: '```json\n["Food", "Groceries"]\n```'
+    batcher = server.CategorizationBatcher(window_ms=10, max_size=20)
+
+    assert submit_all(batcher, [("Pizza night", 30), ("Kroger run", 80)]) == ["Food", "Other"]
+
+
+@pytest.mark.parametrize("reply", ['["Food"]', "Food, Bills", '{"categories": ["Food", "Bills"]}'])
+def test_malformed_or_short_reply_fails_every_caller(llm, reply):
+    llm.reply = lambda text: reply
+    batcher = server.CategorizationBatcher(window_ms=10, max_size=20)
+
+    results = submit_all(batcher, [("Pizza night", 30), ("Rent due", 900)])
+
+    assert all(isinstance(r, ValueError) for r in results)
+    assert batcher.failed_batches == 1
+
+
+def test_llm_error_fans_out_to_every_caller(llm):
+    def reply(text):
+        raise server.LlmUnavailable("LLM circuit open for categorize_batch")
+    llm.reply = reply
+    batcher = server.CategorizationBatcher(window_ms=10, max_size=20)
+
+    results = submit_all(batcher, [("Pizza night", 30), ("Rent due", 900), ("Uber ride", 12)])
+
+    assert len(results) == 3
+    assert all(isinstance(r, server.LlmUnavailable) for r in results)
+    assert batcher.failed_batches == 1
+    assert not batcher._sending
+
+
+def test_batching_disabled_calls_llm_per_item(llm):
+    llm.reply = lambda text: "Food"
+    batcher = server.CategorizationBatcher(window_ms=0, max_size=20)
+
+    assert submit_all(batcher, [("Pizza night", 30), ("Burger", 12)]) == ["Food", "Food"]
+    assert [purpose for purpose, _ in llm.prompts] == ["categorize", "categorize"]
+    assert batcher.batches == 0
@@ -0,0 +1,51 @@
+import asyncio
+
+import server
+
+
+class StreamedBody:
+    """Stands in for a Request whose body arrives in the given chunks"""
+
+    def __init__(self, *chunks: str):
+        self.chunks = [c.encode() for c in chunks]
+
+    async def stream(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+def import_rows(*chunks: str) -> list:
+    async def collect():
+        return [row async for row in server.iter_import_rows(StreamedBody(*chunks), "csv")]
+    return asyncio.run(collect())
+
+
+HEADER = "amount,description,date,category\n"
+
+
+def test_unquoted_inch_mark_does_not_swallow_later_rows():
+    rows = import_rows(HEADER + '5,12" pizza,2024-01-01,Food\n' + "3,Coffee,2024-01-02,Food\n")
+    assert rows == [
+        (1, {"amount": "5", "description": '12" pizza', "date": "2024-01-01", "category": "Food"}),
+        (2, {"amount": "3", "description": "Coffee", "date": "2024-01-02", "category": "Food"}),
+    ]
+
+
+def test_quoted_field_spanning_lines_and_chunks():
+    rows = import_rows(HEADER + '7,"Dinner\nwith ""friends', '""",2024-01-03,Food\n')
+    assert rows == [
+        (1, {"amount": "7", "description": 'Dinner\nwith "friends"', "date": "2024-01-03", "category": "Food"}),
+    ]
+
+
+def test_blank_lines_skipped_and_column_mismatch_reported():
+    rows = import_rows(HEADER + "\n4,Lunch,2024-01-04\n\n2,Tea,2024-01-05,Food")
+    assert rows == [
+        (1, "Expected 4 columns, got 3"),
+        (2, {"amount": "2", "description": "Tea", "date": "2024-01-05", "category": "Food"}),
+    ]
+
+
+def test_unterminated_quoted_field():
+    rows = import_rows(HEADER + '9,"never closed,2024-01-06,Food\n')
+    assert rows == [(1, "Unterminated quoted field")]
@@ -0,0 +1,85 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def raw_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trips_a_stored_date():
+    date = datetime(2024, 3, 5, tzinfo=timezone.utc)
+    cursor = server.encode_expense_cursor({"date": date, "id": "e1"})
+
+    assert "=" not in cursor
+    assert server.decode_expense_cursor(cursor) == (date, "e1")
+
+
+def test_cursor_round_trips_a_legacy_string_date():
+    cursor = server.encode_expense_cursor({"date": "2024-03-05", "id": "e1"})
+
+    assert server.decode_expense_cursor(cursor) == ("2024-03-05", "e1")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 at all!",
+    raw_cursor({"date": "2024-03-05", "id": "e1"}),
+    raw_cursor(["2024-03-05"]),
+    raw_cursor([20240305, "e1"]),
+    raw_cursor(["2024-03-05", {"$gt": ""}]),
+    raw_cursor(["2024-13-45", "e1", "date"]),
+    server.encode_expense_cursor({"date": "2024-03-05", "id": "e1"})[:-3],
+])
+def test_invalid_or_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        server.decode_expense_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_invalid_cursor_gets_400_from_the_route(client):
+    response = client.get("/api/expenses", params={"limit": 2, "after": raw_cursor({"id": "e1"})})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+def store_expenses(db, rows: list):
+    asyncio.run(db.expenses.insert_many([
+        {
+            "id": expense_id,
+            "user_id": "u1",
+            "amount_cents": 100,
+            "category": "Food",
+            "description": f"Expense {expense_id}",
+            "date": server.expense_date_to_bson(date),
+            "ai_categorized": False,
+            "category_pending": False,
+            "created_at": datetime.now(timezone.utc),
+        }
+        for expense_id, date in rows
+    ]))
+
+
+def all_pages(client, limit: int) -> list:
+    ids, params = [], {"limit": limit}
+    while True:
+        response = client.get("/api/expenses", params=params)
+        assert response.status_code == 200
+        ids += [e["id"] for e in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids
+        params = {"limit": limit, "after": cursor}
+
+
+def test_pages_split_expenses_sharing_a_date(client, db):
+    # Five expenses on one day straddle every page boundary at limit=2
+    store_expenses(db, [("a", "2024-03-04")] + [(f"t{i}", "2024-03-05") for i in range(5)] + [("z", "2024-03-06")])
+
+    assert all_pages(client, limit=2) == ["z", "t4", "t3", "t2", "t1", "t0", "a"]
@@ -0,0 +1,257 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+class StubMessage:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubChat:
+    """Replies through `reply(text)`; counts calls and the most that ran at once"""
+
+    reply = None
+    calls = 0
+    running = 0
+    max_running = 0
+
+    def __init__(self, api_key=None, session_id=None, system_message=None):
+        pass
+
+    async def send_message(self, message):
+        cls = type(self)
+        cls.calls += 1
+        cls.running += 1
+        cls.max_running = max(cls.max_running, cls.running)
+        try:
+            return await cls.reply(message.text)
+        finally:
+            cls.running -= 1
+
+
+class StubStreamingChat(StubChat):
+    chunks = ()
+    delay = 0
+
+    async def run_astream(self, message):
+        type(self).calls += 1
+        for chunk in self.chunks:
+            await asyncio.sleep(self.delay)
+            yield {"type": "text", "text": chunk}
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """Fresh LlmClient settings: 2-failure breaker, 0.1s deadline, one slot"""
+    for cls in (StubChat, StubStreamingChat):
+        monkeypatch.setattr(cls, "calls", 0)
+        monkeypatch.setattr(cls, "running", 0)
+        monkeypatch.setattr(cls, "max_running", 0)
+    monkeypatch.setattr(server, "LLM_BREAKER_FAILURES", 2)
+    monkeypatch.setattr(server, "LLM_BREAKER_RESET_SECONDS", 30)
+    monkeypatch.setattr(server, "LLM_TIMEOUT_SECONDS", 0.1)
+    monkeypatch.setattr(server, "LLM_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(server, "_llm_slots", None)
+    monkeypatch.setattr(server, "_llm_clients", {})
+    monkeypatch.setattr(server, "llm_classes", lambda: (StubChat, StubMessage))
+    return server.LlmClient("test", "system")
+
+
+def replying(text: str, delay: float = 0):
+    async def reply(_):
+        await asyncio.sleep(delay)
+        return text
+    return reply
+
+
+async def failing(_):
+    raise RuntimeError("upstream error")
+
+
+def expire(breaker: server.CircuitBreaker):
+    breaker.opened_at -= breaker.reset_seconds
+
+
+# ---- CircuitBreaker ----
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = server.CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats() == {"state": "open", "consecutive_failures": 3, "times_opened": 1, "rejected": 1}
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = server.CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_breaker_half_open_lets_one_trial_through():
+    breaker = server.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    expire(breaker)
+
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_breaker_closes_after_successful_trial():
+    breaker = server.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_breaker_reopens_after_failed_trial():
+    breaker = server.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+
+
+def test_breaker_released_trial_frees_the_slot():
+    breaker = server.CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    expire(breaker)
+    assert breaker.allow()
+
+    breaker.release_trial()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+# ---- LlmClient ----
+
+def test_send_returns_reply_and_keeps_breaker_closed(llm):
+    StubChat.reply = replying("Food")
+    assert asyncio.run(llm.send("test", "prompt")) == "Food"
+    assert llm.breaker.state == "closed"
+
+
+def test_failures_open_breaker_and_later_calls_are_rejected(llm):
+    StubChat.reply = failing
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await llm.send("test", "prompt")
+        with pytest.raises(server.LlmUnavailable):
+            await llm.send("test", "prompt")
+
+    asyncio.run(scenario())
+    assert llm.breaker.state == "open"
+    assert StubChat.calls == 2
+
+
+def test_timeout_counts_as_failure(llm):
+    StubChat.reply = replying("late", delay=0.5)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(llm.send("test", "prompt"))
+    assert llm.timeouts == 1
+    assert llm.breaker.consecutive_failures == 1
+    assert llm.in_flight == 0
+
+
+def test_half_open_trial_success_closes_breaker(llm):
+    StubChat.reply = failing
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await llm.send("test", "prompt")
+        expire(llm.breaker)
+        StubChat.reply = replying("Bills")
+        return await llm.send("test", "prompt")
+
+    assert asyncio.run(scenario()) == "Bills"
+    assert llm.breaker.state == "closed"
+
+
+def test_concurrent_calls_share_the_slots(llm):
+    StubChat.reply = replying("Food", delay=0.02)
+
+    async def scenario():
+        return await asyncio.gather(*(llm.send("test", "prompt") for _ in range(3)))
+
+    assert asyncio.run(scenario()) == ["Food"] * 3
+    assert StubChat.max_running == 1
+
+
+def test_deadline_includes_waiting_for_a_slot(llm):
+    StubChat.reply = replying("Food", delay=0.07)
+
+    async def scenario():
+        return await asyncio.gather(llm.send("test", "first"), llm.send("test", "second"), return_exceptions=True)
+
+    first, second = asyncio.run(scenario())
+    assert first == "Food"
+    assert isinstance(second, asyncio.TimeoutError)
+    assert StubChat.calls == 2
+    assert llm.in_flight == 0
+
+
+def test_stream_shares_one_deadline(llm, monkeypatch):
+    monkeypatch.setattr(server, "llm_classes", lambda: (StubStreamingChat, StubMessage))
+    monkeypatch.setattr(StubStreamingChat, "chunks", ("a", "b", "c", "d", "e"))
+    monkeypatch.setattr(StubStreamingChat, "delay", 0.04)
+
+    async def scenario():
+        parts = []
+        with pytest.raises(asyncio.TimeoutError):
+            async for piece in llm.stream("test", "prompt"):
+                parts.append(piece)
+        return parts
+
+    # Every chunk arrives well within the deadline on its own, the stream as a whole does not
+    parts = asyncio.run(scenario())
+    assert 1 <= len(parts) < 5
+    assert parts == ["a", "b", "c", "d", "e"][:len(parts)]
+    assert llm.timeouts == 1
+    assert server.llm_slots()._value == 1
+
+
+def test_expense_falls_back_to_other_while_breaker_is_open(llm, client, monkeypatch):
+    async def not_local(description, user_id=None):
+        return None
+
+    observed = []
+    monkeypatch.setattr(server, "categorize_expense_locally", not_local)
+    monkeypatch.setattr(server.categorization_batcher, "window", 0)
+    monkeypatch.setattr(server.local_categorizer, "observe", lambda *args: observed.append(args))
+    StubChat.reply = failing
+
+    expense = {"amount": 10.0, "description": "Zorblax 42", "date": "2024-03-05"}
+    categories = [client.post("/api/expenses", json=expense).json()["category"] for _ in range(4)]
+
+    assert categories == ["Other"] * 4
+    # The breaker opened after two failures, so the last two never reached the LLM
+    assert StubChat.calls == 2
+    llm_client, = server._llm_clients.values()
+    assert llm_client.breaker.state == "open"
+    assert llm_client.breaker.rejected == 2
+    # The fallback is not a real category for this description, so nothing was learned
+    assert observed == []
+
+    client.post("/api/expenses", json={**expense, "category": "Food"})
+    assert observed == [("u1", "Zorblax 42", "Food")]
@@ -0,0 +1,24 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+
+
+def test_registration_losing_a_race_for_the_email_gets_400(db, monkeypatch):
+    asyncio.run(server.ensure_indexes())
+
+    # Another request registers the same email while this one is hashing the password
+    async def hash_while_another_registers(password):
+        await db.users.insert_one({"id": "other", "email": "new@example.com", "name": "Other"})
+        return "hash"
+
+    monkeypatch.setattr(server, "hash_password_async", hash_while_another_registers)
+    registration = server.UserRegister(email="new@example.com", password="pw123456", name="New")
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.register(registration))
+
+    assert (error.value.status_code, error.value.detail) == (400, "Email already registered")
+    assert asyncio.run(db.users.count_documents({"email": "new@example.com"})) == 1
@@ -0,0 +1,113 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+
+def legacy_expense(_id, **fields) -> dict:
+    return {
+        "_id": _id,
+        "id": f"expense-{_id}",
+        "user_id": "u1",
+        "amount": 12.5,
+        "category": "Food",
+        "description": "Lunch",
+        "date": "2024-03-05",
+        "created_at": "2024-03-05T12:30:00+00:00",
+        **fields,
+    }
+
+
+# ---- migrate_expense_doc ----
+
+def test_legacy_string_date_becomes_utc_datetime():
+    changes, _ = server.migrate_expense_doc(legacy_expense(1))
+
+    assert changes["date"] == datetime(2024, 3, 5, tzinfo=timezone.utc)
+    assert changes["created_at"] == datetime(2024, 3, 5, 12, 30, tzinfo=timezone.utc)
+
+
+def test_naive_created_at_is_taken_as_utc():
+    changes, _ = server.migrate_expense_doc(legacy_expense(1, created_at="2024-03-05T12:30:00"))
+
+    assert changes["created_at"] == datetime(2024, 3, 5, 12, 30, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("amount, cents", [(0.1 + 0.2, 30), (19.99, 1999), (0.005, 1), (100, 10000)])
+def test_float_amount_is_rounded_to_cents(amount, cents):
+    changes, removals = server.migrate_expense_doc(legacy_expense(1, amount=amount))
+
+    assert changes["amount_cents"] == cents
+    assert removals == {"amount": ""}
+
+
+def test_unparseable_fields_are_left_alone():
+    doc = legacy_expense(1, date="05/03/2024", created_at="yesterday")
+    del doc["amount"]
+    doc["amount_cents"] = 1250
+
+    assert server.migrate_expense_doc(doc) == ({}, {})
+
+
+def test_migrated_expense_needs_no_changes():
+    doc = legacy_expense(1, date=datetime(2024, 3, 5, tzinfo=timezone.utc), created_at=datetime.now(timezone.utc))
+    del doc["amount"]
+    doc["amount_cents"] = 1250
+
+    assert server.migrate_expense_doc(doc) == ({}, {})
+
+
+# ---- migrate_storage ----
+
+def seed(db, docs: list):
+    asyncio.run(db.expenses.insert_many(docs))
+
+
+def stored(db) -> list:
+    return asyncio.run(db.expenses.find({}).sort("_id", 1).to_list(None))
+
+
+def test_migrate_storage_converts_and_skips_unparseable_rows(db):
+    unparseable = legacy_expense(1, date="05/03/2024", created_at=datetime(2024, 3, 5, tzinfo=timezone.utc), amount_cents=500)
+    del unparseable["amount"]
+    seed(db, [unparseable, legacy_expense(2, amount=19.99), legacy_expense(3, amount=0.1 + 0.2)])
+
+    counts = asyncio.run(server.migrate_storage("expenses", batch_size=2))
+
+    assert counts == {"scanned": 3, "converted": 2, "skipped": 1}
+    unparseable, first, second = stored(db)
+    assert unparseable["date"] == "05/03/2024"
+    assert first["amount_cents"] == 1999 and "amount" not in first
+    assert second["amount_cents"] == 30
+    assert first["date"] == datetime(2024, 3, 5, tzinfo=timezone.utc)
+
+
+def test_migrate_storage_resumes_from_checkpoint(db, monkeypatch):
+    unparseable = legacy_expense(1, date="not a date", created_at=None, amount_cents=100)
+    del unparseable["amount"]
+    seed(db, [unparseable] + [legacy_expense(i) for i in range(2, 6)])
+    legacy_filter, convert = server.STORAGE_MIGRATIONS["expenses"]
+
+    def interrupted(doc):
+        if doc["_id"] == 3:
+            raise RuntimeError("interrupted")
+        return convert(doc)
+
+    # The first batch (rows 1 and 2) is checkpointed before the second batch fails
+    monkeypatch.setitem(server.STORAGE_MIGRATIONS, "expenses", (legacy_filter, interrupted))
+    with pytest.raises(RuntimeError):
+        asyncio.run(server.migrate_storage("expenses", batch_size=2))
+    checkpoint = asyncio.run(db.migrations.find_one({"_id": "storage:expenses"}))
+    assert checkpoint["last_id"] == 2
+
+    monkeypatch.setitem(server.STORAGE_MIGRATIONS, "expenses", (legacy_filter, convert))
+    counts = asyncio.run(server.migrate_storage("expenses", batch_size=2))
+
+    # The unparseable row 1 is behind the checkpoint and is not scanned again
+    assert counts == {"scanned": 3, "converted": 3, "skipped": 0}
+    assert all(isinstance(doc["amount_cents"], int) for doc in stored(db))
+
+    counts = asyncio.run(server.migrate_storage("expenses", batch_size=2, restart=True))
+    assert counts == {"scanned": 1, "converted": 0, "skipped": 1}
@@ -0,0 +1,119 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def sync(client, monkeypatch):
+    """GET /sync with no rescan window, so each delta holds exactly the new changes"""
+    monkeypatch.setattr(server, "SYNC_RESCAN_WINDOW", 0)
+
+    def get(since=None):
+        response = client.get("/api/sync", params={"since": since} if since else {})
+        assert response.status_code == 200
+        return response.json()
+    return get
+
+
+def add_expense(client, description: str) -> str:
+    response = client.post("/api/expenses", json={
+        "amount": 12.5, "category": "Food", "description": description, "date": "2024-03-05"
+    })
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def test_first_sync_is_a_full_snapshot(client, sync):
+    lunch = add_expense(client, "Lunch")
+
+    snapshot = sync()
+
+    assert snapshot["full"] is True
+    assert [e["id"] for e in snapshot["expenses"]] == [lunch]
+    assert snapshot["expenses"][0]["date"] == "2024-03-05"
+    assert snapshot["deleted"] == {"expenses": [], "budgets": []}
+
+
+def test_delta_has_changes_and_tombstones(client, sync):
+    lunch = add_expense(client, "Lunch")
+    dinner = add_expense(client, "Dinner")
+    cursor = sync()["cursor"]
+
+    coffee = add_expense(client, "Coffee")
+    assert client.delete(f"/api/expenses/{lunch}").status_code == 200
+    assert client.post("/api/budgets", json={"category": "Food", "limit": 200, "month": 3, "year": 2024}).status_code == 200
+
+    delta = sync(cursor)
+
+    assert delta["full"] is False
+    assert [e["id"] for e in delta["expenses"]] == [coffee]
+    assert [b["category"] for b in delta["budgets"]] == ["Food"]
+    assert delta["deleted"] == {"expenses": [lunch], "budgets": []}
+    assert dinner not in [e["id"] for e in delta["expenses"]]
+
+    # Nothing changed since: an empty delta and the same cursor
+    again = sync(delta["cursor"])
+    assert (again["expenses"], again["budgets"], again["deleted"]) == ([], [], {"expenses": [], "budgets": []})
+    assert again["cursor"] == delta["cursor"]
+
+
+def test_cursor_behind_compacted_tombstones_gets_a_snapshot(client, sync):
+    lunch = add_expense(client, "Lunch")
+    dinner = add_expense(client, "Dinner")
+    cursor = sync()["cursor"]
+    client.delete(f"/api/expenses/{lunch}")
+
+    assert asyncio.run(server.compact_tombstones(retention_days=-1)) == 1
+    result = sync(cursor)
+
+    assert result["full"] is True
+    assert [e["id"] for e in result["expenses"]] == [dinner]
+
+
+def test_cursor_ahead_of_the_server_gets_a_snapshot(client, sync):
+    add_expense(client, "Lunch")
+
+    assert sync(server.encode_sync_cursor(1000))["full"] is True
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    base64.urlsafe_b64encode(b"[1]").decode(),
+    base64.urlsafe_b64encode(json.dumps({"seq": -1}).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps({"seq": "5"}).encode()).decode(),
+    base64.urlsafe_b64encode(json.dumps({"seq": True}).encode()).decode(),
+])
+def test_invalid_sync_cursor_gets_400(client, cursor):
+    response = client.get("/api/sync", params={"since": cursor})
+
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid sync cursor"}
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_sync_datetimes_match_the_list_endpoints(client, sync, db, monkeypatch, fast):
+    monkeypatch.setattr(server, "FAST_JSON_RESPONSES", fast)
+    add_expense(client, "Lunch")
+    # A budget written before created_at was stored as a native date
+    asyncio.run(db.budgets.insert_one({
+        "id": "legacy-budget", "user_id": "u1", "category": "Food", "limit": 100.0,
+        "month": 3, "year": 2024, "created_at": "2024-03-01T08:00:00+00:00"
+    }))
+
+    snapshot = sync()
+
+    assert snapshot["expenses"][0]["created_at"] == client.get("/api/expenses").json()[0]["created_at"]
+    assert snapshot["budgets"][0]["created_at"] == client.get("/api/budgets").json()[0]["created_at"]
+    assert snapshot["budgets"][0]["created_at"] == "2024-03-01T08:00:00Z"
+
+
+def test_json_fallback_encodes_datetimes_like_pydantic(monkeypatch):
+    monkeypatch.setattr(server, "orjson", None)
+    content = {"at": datetime(2024, 3, 1, 8, 0, 0, 500, tzinfo=timezone.utc)}
+
+    assert server.dumps_json(content) == b'{"at":"2024-03-01T08:00:00.000500Z"}'